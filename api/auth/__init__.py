@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from api.auth.views import router as router_v2
+from api.auth.views import hasher_busy_handler, router as router_v2
 
 router = APIRouter()
 router.include_router(router=router_v2)
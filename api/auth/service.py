@@ -6,13 +6,18 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.auth.schemas import UserCreate, UserLogin, VerifyPassword
+from core.models.redis_helper import (
+    CodeStatus,
+    PrincipalCache,
+    RefreshTokenStore,
+    ResetCodesCache,
+)
 from core.models.users import User
 from core.security import (
     get_user_id_by_token,
-    hashed_content,
     verify_password,
-    create_jwt_token,
     create_password_hash,
+    issue_tokens,
 )
 
 
@@ -29,7 +34,7 @@ async def get_user_by_username(
 
 
 async def create_new_user(session: AsyncSession, user_in: UserCreate):
-    user_password = hashed_content.hash(user_in.password)
+    user_password = await create_password_hash(user_in.password)
     new_user = User(email=user_in.email, password_hash=user_password)
     session.add(new_user)
     await session.commit()
@@ -37,20 +42,33 @@ async def create_new_user(session: AsyncSession, user_in: UserCreate):
     return new_user
 
 
-async def authenticate(session: AsyncSession, user_in: UserLogin):
-    user = await get_user_by_username(session, user_in.email)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(password=user_in.password, password_hash=user.password_hash):
+# Для неизвестного email проверка стоит столько же: по времени ответа
+# не понять, есть ли такой пользователь
+DUMMY_PASSWORD_HASH = (
+    "$5$rounds=535000$jlAP3s2mOyBIYFLx$WBgQ9Erye1fhu7Ykihg3pEU8DaPcMGBqf4TSIlIV4q2"
+)
+
+
+async def login_user(
+    session: AsyncSession, user_in: UserLogin, tokens: RefreshTokenStore
+) -> tuple[str, str]:
+    result = await session.execute(
+        select(User.id, User.password_hash, User.is_verified, User.is_active).where(
+            User.email == user_in.email
+        )
+    )
+    user = result.one_or_none()
+    password_hash = user.password_hash if user is not None else DUMMY_PASSWORD_HASH
+    verified = await verify_password(
+        password=user_in.password, password_hash=password_hash
+    )
+    if user is None or not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     if not user.is_verified:
         raise HTTPException(status_code=401, detail="Not verified user")
-    return create_jwt_token(user.id, token_type="access")
-
-
-async def create_refresh_token(session: AsyncSession, user_in: UserLogin):
-    user = await get_user_by_username(session=session, username=user_in.email)
-    return create_jwt_token(user.id, time_in_minutes=10080, token_type="refresh")
+    if not user.is_active:
+        raise HTTPException(status_code=401, detail="Inactive user")
+    return await issue_tokens(user.id, tokens)
 
 
 def create_confirm_code() -> str:
@@ -58,14 +76,26 @@ def create_confirm_code() -> str:
 
 
 async def verify_confirm_codes_and_update_user(
-    code: str, code_hash: str, data: VerifyPassword, session: AsyncSession
+    code: str,
+    code_hash: str,
+    data: VerifyPassword,
+    session: AsyncSession,
+    principal_cache: PrincipalCache,
+    cache: ResetCodesCache,
 ):
-    if verify_password(code, code_hash):
+    if code_hash and await verify_password(code, code_hash):
+        # Гасим только проверенный код: параллельный запрос с тем же кодом
+        # или уже выданный новый код не пройдут
+        if not await cache.consume_if_equal(data.email, code_hash):
+            raise HTTPException(status_code=401, detail="Invalid confirm code")
         user = await get_user_by_username(username=data.email, session=session)
         if user is not None and user.is_verified:
-            user.password_hash = create_password_hash(password=data.password)
+            user.password_hash = await create_password_hash(password=data.password)
             await session.commit()
             await session.refresh(user)
+            await principal_cache.invalidate(user.id)
             return {"detail": "Password was changed successful."}
         raise HTTPException(status_code=401, detail="Invalid email")
+    if code_hash and await cache.register_failure(data.email) == CodeStatus.EXHAUSTED:
+        raise HTTPException(status_code=401, detail="Too many attempts")
     raise HTTPException(status_code=401, detail="Invalid confirm code")
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends, Response, Cookie
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Cookie
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -14,25 +15,64 @@ from api.auth.schemas import (
 from api.auth.service import (
     get_user_by_username,
     create_new_user,
-    authenticate,
-    create_refresh_token,
+    login_user,
     create_confirm_code,
     verify_confirm_codes_and_update_user,
 )
+from core.hasher import HasherBusy
 from core.models import db_helper
 from core.models.redis_helper import (
+    CodeStatus,
     VerificationCodesCache,
     get_confirm_codes_cache,
     ResetCodesCache,
     get_reset_codes_cache,
+    PrincipalCache,
+    get_principal_cache,
+    RefreshTokenStore,
+    get_refresh_tokens,
 )
 from core.models.users import User
-from core.security import token_refresh, get_current_user
+from core.query_budget import query_budget
+from core.rate_limit import rate_limit
+from core.config import setting
+from core.security import (
+    token_refresh,
+    get_current_user,
+    decode_refresh_token,
+)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+REFRESH_COOKIE = "refresh_token"
+REFRESH_COOKIE_PATH = "/auth"
+
+
+async def hasher_busy_handler(request: Request, exc: HasherBusy):
+    return JSONResponse(
+        {"detail": "Server is busy, try again later"},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
+
+def set_refresh_cookie(response: Response, refresh_token: str):
+    response.set_cookie(
+        key=REFRESH_COOKIE,
+        value=refresh_token,
+        max_age=setting.refresh_token_minutes * 60,
+        httponly=True,
+        # secure=True,
+        path=REFRESH_COOKIE_PATH,
+    )
+
 
-@router.post("/register", response_model=UserResponse)
+@router.post(
+    "/register",
+    response_model=UserResponse,
+    dependencies=[Depends(rate_limit("register"))],
+)
+@query_budget(3)
 async def register(
     user_in: UserCreate,
     session: AsyncSession = Depends(db_helper.session_dependency),
@@ -51,67 +91,90 @@ async def register(
     return await create_new_user(session, user_in)
 
 
-@router.post("/login", response_model=TokenResponse)
+@router.post(
+    "/login", response_model=TokenResponse, dependencies=[Depends(rate_limit("login"))]
+)
+@query_budget(1)
 async def login(
     # user_in: UserLogin,
     response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),  # в том числе
     session: AsyncSession = Depends(db_helper.session_dependency),
+    tokens: RefreshTokenStore = Depends(get_refresh_tokens),
 ):
     user_in = UserLogin(
         email=form_data.username, password=form_data.password
     )  # Для тестирования в OpenAPI
-    token = await authenticate(session=session, user_in=user_in)
-    refresh_token = await create_refresh_token(user_in=user_in, session=session)
-    response.set_cookie(
-        key="refresh_token",
-        value=refresh_token,
-        max_age=60 * 60 * 24 * 7,
-        httponly=True,
-        # secure=True,
-        path="/auth/refresh",
-    )
-    return {"access_token": token, "token_type": "bearer"}
+    access_token, refresh_token = await login_user(session, user_in, tokens)
+    set_refresh_cookie(response, refresh_token)
+    return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.post("/refresh")
-async def refresh(refresh_token: str | None = Cookie(default=None)):
-    token = token_refresh(refresh_token=refresh_token)
-    return {"access_token": token, "token_type": "bearer"}
+@query_budget(0)
+async def refresh(
+    response: Response,
+    refresh_token: str | None = Cookie(default=None),
+    tokens: RefreshTokenStore = Depends(get_refresh_tokens),
+):
+    access_token, refresh_token = await token_refresh(refresh_token, tokens)
+    set_refresh_cookie(response, refresh_token)
+    return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.post("/logout")
-async def logout(response: Response):
+@query_budget(0)
+async def logout(
+    response: Response,
+    refresh_token: str | None = Cookie(default=None),
+    tokens: RefreshTokenStore = Depends(get_refresh_tokens),
+):
+    if refresh_token:
+        try:
+            payload = decode_refresh_token(refresh_token)
+        except HTTPException:
+            payload = None
+        if payload is not None:
+            await tokens.revoke(payload["fam"])
     response.delete_cookie(
-        key="refresh_token",
+        key=REFRESH_COOKIE,
+        path=REFRESH_COOKIE_PATH,
         httponly=True,
         samesite="lax",
     )
     return {"detail": "Logged out"}
 
 
-@router.post("/verify")
+@router.post("/verify", dependencies=[Depends(rate_limit("verify"))])
+@query_budget(2)
 async def verify(
     data: VerifyEmail,
     session: AsyncSession = Depends(db_helper.session_dependency),
     cache: VerificationCodesCache = Depends(get_confirm_codes_cache),
+    principal_cache: PrincipalCache = Depends(get_principal_cache),
 ):
-    key = data.email
-    stored_key = await cache.get(key)
-    if not stored_key:
+    # Сравнение и погашение одним скриптом: два параллельных верных запроса
+    # не пройдут оба
+    status = await cache.consume(data.email, data.code)
+    if status == CodeStatus.MISSING:
         raise HTTPException(status_code=400, detail="Confirm code expired or invalid")
-    if stored_key != data.code:
+    if status == CodeStatus.EXHAUSTED:
+        raise HTTPException(status_code=400, detail="Too many attempts")
+    if status != CodeStatus.OK:
         raise HTTPException(status_code=400, detail="Invalid code")
     user = await get_user_by_username(session, data.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.is_verified = True
     await session.commit()
-    await cache.delete(data.email)
+    await principal_cache.invalidate(user.id)
     return {"detail": "User is verified."}
 
 
-@router.post("/password_reset/request")
+@router.post(
+    "/password_reset/request", dependencies=[Depends(rate_limit("password_reset"))]
+)
+@query_budget(0)
 async def password_reset(
     email: EmailStr,
     cache: ResetCodesCache = Depends(get_reset_codes_cache),
@@ -122,12 +185,19 @@ async def password_reset(
 
 
 @router.post("/password_reset/confirm")
+@query_budget(3)
 async def password_confirm(
     data: VerifyPassword,
     cache: ResetCodesCache = Depends(get_reset_codes_cache),
     session: AsyncSession = Depends(db_helper.session_dependency),
+    principal_cache: PrincipalCache = Depends(get_principal_cache),
 ):
     stored_code = await cache.get(email=data.email)
     return await verify_confirm_codes_and_update_user(
-        code=data.code, code_hash=stored_code, data=data, session=session
+        code=data.code,
+        code_hash=stored_code,
+        data=data,
+        session=session,
+        principal_cache=principal_cache,
+        cache=cache,
     )
@@ -0,0 +1,6 @@
+from fastapi import APIRouter
+
+from api.monitoring.views import router as monitoring_router
+
+router = APIRouter()
+router.include_router(router=monitoring_router)
@@ -0,0 +1,80 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from core.config import setting
+from core.hasher import password_hasher
+from core.metrics import render_metrics, render_samples
+from core.models import db_helper
+
+router = APIRouter()
+
+pool_gauges = ("size", "checked_in", "checked_out", "overflow")
+pool_counters = ("checkouts", "timeouts", "wait_seconds_total")
+
+
+def _runtime_metrics() -> list[str]:
+    pools = [("primary", db_helper.pool_metrics())] + [
+        (replica.name, db_helper.pool_metrics(replica.engine))
+        for replica in db_helper.replicas
+    ]
+    lines = []
+    for name in pool_gauges + pool_counters:
+        lines += render_samples(
+            f"db_pool_{name}",
+            f"Connection pool {name.replace('_', ' ')}",
+            [({"engine": engine}, metrics[name]) for engine, metrics in pools],
+            kind="counter" if name in pool_counters else "gauge",
+        )
+    lines += render_samples(
+        "db_pool_wait_seconds_max",
+        "Longest wait for a pooled connection",
+        [
+            ({"engine": engine}, metrics["wait_seconds_max"])
+            for engine, metrics in pools
+        ],
+    )
+    lines += render_samples(
+        "db_replica_lag_seconds",
+        "Replica replay lag, -1 if unavailable",
+        [
+            (
+                {"replica": status["name"]},
+                -1 if status["lag"] is None else status["lag"],
+            )
+            for status in db_helper.replica_status()
+        ],
+    )
+    lines += render_samples(
+        "password_hasher_pending",
+        "Password hashing jobs in flight",
+        [({}, password_hasher.pending)],
+    )
+    return lines
+
+
+def require_metrics_token(authorization: str | None = Header(None)):
+    if setting.metrics_token is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {setting.metrics_token}"
+    if authorization is None or not hmac.compare_digest(
+        authorization.encode(), expected.encode()
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    include_in_schema=False,
+    dependencies=[Depends(require_metrics_token)],
+)
+async def metrics():
+    return PlainTextResponse(
+        render_metrics(_runtime_metrics()), media_type="text/plain; version=0.0.4"
+    )
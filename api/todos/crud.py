@@ -1,27 +1,66 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Annotated
 from uuid import uuid4
 
 from fastapi import HTTPException, Path, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
+from sqlalchemy import (
+    Select,
+    select,
+    update,
+    delete,
+    insert,
+    func,
+    any_,
+    literal,
+    literal_column,
+    Integer,
+    BigInteger,
+    Text,
+    cast,
+    tuple_,
+    union_all,
+    true,
+    false,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, REAL, insert as pg_insert
 from sqlalchemy.engine import Result
 
-from api.todos.schemas import CreateTask, UpdateTask, CreateRoom, GetRoom
-from core.models import db_helper, Room, Room_Member
-from core.models.redis_helper import InvitesCodesCaches
+from api.todos.serializers import task_columns, fields_columns
+from api.todos.pagination import (
+    DEFAULT_PAGE_SIZE,
+    parse_ordering,
+    paginate,
+    next_cursor,
+    encode_sync_token,
+    decode_sync_token,
+    encode_search_cursor,
+    decode_search_cursor,
+)
+from api.todos.schemas import (
+    CreateTask,
+    UpdateTask,
+    CreateRoom,
+    GetRoom,
+    BatchUpdateTask,
+    MAX_BATCH_SIZE,
+)
+from core.models import db_helper, Room, Room_Member, TaskTombstone
+from core.models.redis_helper import (
+    InvitesCodesCaches,
+    RoomMembersCache,
+    get_room_events,
+    get_task_list_cache,
+)
 from core.models.room_member import Roles
-from core.models.tasks import Task, OwnerType
-from core.models.users import User
-from core.security import get_current_user
-
-good_fields = ["created_at", "completed_at", "due_at", "completed"]
+from core.models.tasks import Task, OwnerType, SEARCH_CONFIG
+from core.security import Principal, get_current_user
 
 
 async def create_task(
     session: AsyncSession,
     task_in: CreateTask,
-    user: User,
+    user: Principal,
     owner_type: str = OwnerType.USER,
 ):
     task = Task(**task_in.model_dump(), user_id=user.id)
@@ -32,68 +71,266 @@ async def create_task(
     session.add(task)
     await session.commit()
     await session.refresh(task)
+    await task_changed(task, "task_created", user)
     return task
 
 
-async def get_all_tasks(
-    session: AsyncSession,
+def task_list_query(
     order_by: str,
-    user: User,
+    user: Principal,
     owner_type: OwnerType = OwnerType.USER,
     room_id: int | None = None,
-) -> list[Task]:
-    order_status = "ASC"
-    field = order_by
-    if order_by.startswith("-"):
-        field = order_by[1:]
-        order_status = "DESC"
-    if field in good_fields:
-        stmt = select(Task)
-        # .where(Task.user_id == user.id, Task.owner_type == owner_type)
-        # .order_by(text(f"{field} {order_status}"))
-        # )
-        if owner_type == OwnerType.USER:
-            stmt = stmt.where(Task.user_id == user.id, Task.owner_type == owner_type)
-        elif owner_type == OwnerType.ROOM:
-            if not room_id:
-                raise HTTPException(status_code=400, detail="room id is required")
-            stmt = stmt.where(Task.room_id == room_id, Task.owner_type == owner_type)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid owner type")
-        stmt = stmt.order_by(text(f"{field} {order_status}"))
+    cursor: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: tuple[str, ...] | None = None,
+) -> Select:
+    field, _ = parse_ordering(order_by)
+    stmt = select(*fields_columns(fields, "id", field))
+    if owner_type == OwnerType.USER:
+        stmt = stmt.where(Task.user_id == user.id, Task.owner_type == owner_type)
+    elif owner_type == OwnerType.ROOM:
+        if not room_id:
+            raise HTTPException(status_code=400, detail="room id is required")
+        stmt = stmt.where(Task.room_id == room_id, Task.owner_type == owner_type)
     else:
-        raise HTTPException(status_code=400, detail="Invalid ordering category")
+        raise HTTPException(status_code=400, detail="Invalid owner type")
+    return paginate(stmt, order_by=order_by, cursor=cursor, limit=limit)
 
+
+async def get_all_tasks(
+    session: AsyncSession,
+    order_by: str,
+    user: Principal,
+    owner_type: OwnerType = OwnerType.USER,
+    room_id: int | None = None,
+    cursor: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: tuple[str, ...] | None = None,
+) -> dict:
+    stmt = task_list_query(order_by, user, owner_type, room_id, cursor, limit, fields)
     result: Result = await session.execute(stmt)
-    tasks = result.scalars().all()
-    return list(tasks)
+    tasks = list(result.all())
+    return {
+        "items": tasks[:limit],
+        "next_cursor": next_cursor(tasks, order_by=order_by, limit=limit),
+    }
 
 
-async def get_task(
-    session: AsyncSession,
-    task_id: int,
-    user: User,
-    owner_type: str = "user",
-    room_id: int = None,
+def task_scope(
+    user: Principal, owner_type: OwnerType = OwnerType.USER, room_id: int = None
 ):
-    stmt = select(Task)
     if owner_type == OwnerType.USER:
-        stmt = stmt.where(
-            Task.id == task_id, Task.user_id == user.id, Task.owner_type == owner_type
+        return Task.user_id == user.id, Task.owner_type == owner_type
+    if owner_type == OwnerType.ROOM and room_id:
+        return Task.room_id == room_id, Task.owner_type == owner_type
+    raise HTTPException(status_code=400, detail="Uncorrect owner type")
+
+
+def scope_id(user: Principal, owner_type: OwnerType, room_id: int | None) -> int:
+    return room_id if owner_type == OwnerType.ROOM else user.id
+
+
+async def tasks_changed(
+    owner_type: OwnerType,
+    owner_id: int,
+    event: str,
+    task_ids,
+    user: Principal | None = None,
+):
+    await get_task_list_cache().bump(owner_type.value, owner_id)
+    if owner_type == OwnerType.ROOM:
+        await get_room_events().publish(
+            owner_id,
+            {
+                "type": event,
+                "task_ids": list(task_ids),
+                "user_id": user.id if user else None,
+            },
         )
-    elif owner_type == OwnerType.ROOM and room_id:
-        stmt = stmt.where(
-            Task.id == task_id, Task.room_id == room_id, Task.owner_type == owner_type
+
+
+async def task_changed(task: Task, event: str, user: Principal | None = None):
+    owner_id = task.room_id if task.owner_type == OwnerType.ROOM else task.user_id
+    await tasks_changed(task.owner_type, owner_id, event, (task.id,), user)
+
+
+async def search_tasks(
+    session: AsyncSession,
+    user: Principal,
+    q: str,
+    cursor: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    owner_type: OwnerType = OwnerType.USER,
+    room_id: int | None = None,
+) -> dict:
+    config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+    query = func.websearch_to_tsquery(config, q)
+    rank = func.ts_rank_cd(Task.search_vector, query, type_=REAL)
+    page = (
+        select(Task.id, rank.label("rank"))
+        .where(
+            *task_scope(user, owner_type, room_id), Task.search_vector.op("@@")(query)
+        )
+        .order_by(rank.desc(), Task.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        after_rank, after_id = decode_search_cursor(cursor, q)
+        page = page.where(
+            tuple_(rank, Task.id) < tuple_(literal(after_rank, REAL), after_id)
+        )
+    page = page.subquery()
+    stmt = (
+        select(
+            *task_columns,
+            page.c.rank,
+            func.ts_headline(
+                config,
+                Task.title,
+                query,
+                "StartSel=<mark>, StopSel=</mark>, HighlightAll=true",
+            ).label("title_highlight"),
+            func.ts_headline(
+                config,
+                Task.description,
+                query,
+                "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5",
+            ).label("description_highlight"),
         )
+        .join(page, page.c.id == Task.id)
+        .order_by(page.c.rank.desc(), Task.id.desc())
+    )
+    hits = list((await session.execute(stmt)).all())
+    next_cursor = None
+    if len(hits) > limit:
+        last = hits[limit - 1]
+        next_cursor = encode_search_cursor(q, last.rank, last.id)
+    return {"items": hits[:limit], "next_cursor": next_cursor}
+
+
+def tombstone_scope(
+    user: Principal, owner_type: OwnerType = OwnerType.USER, room_id: int = None
+):
+    if owner_type == OwnerType.USER:
+        return TaskTombstone.user_id == user.id, TaskTombstone.owner_type == owner_type
+    if owner_type == OwnerType.ROOM and room_id:
+        return TaskTombstone.room_id == room_id, TaskTombstone.owner_type == owner_type
+    raise HTTPException(status_code=400, detail="Uncorrect owner type")
+
+
+async def get_changes(
+    session: AsyncSession,
+    user: Principal,
+    since: str | None,
+    limit: int,
+    owner_type: OwnerType = OwnerType.USER,
+    room_id: int | None = None,
+) -> dict:
+    after_seq, after_id = decode_sync_token(since)
+    # Граница берётся до чтения: транзакции с xid ниже xmin снимка завершены,
+    # поэтому токен не перепрыгнет через изменения, которые закоммитятся позже
+    upper = await session.scalar(
+        select(
+            cast(
+                cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text),
+                BigInteger,
+            )
+        )
+    )
+    changed = select(
+        Task.change_seq.label("seq"), Task.id.label("id"), false().label("deleted")
+    ).where(
+        *task_scope(user, owner_type, room_id),
+        Task.change_seq < upper,
+        tuple_(Task.change_seq, Task.id) > tuple_(after_seq, after_id),
+    )
+    removed = select(TaskTombstone.change_seq, TaskTombstone.task_id, true()).where(
+        *tombstone_scope(user, owner_type, room_id),
+        TaskTombstone.change_seq < upper,
+        tuple_(TaskTombstone.change_seq, TaskTombstone.task_id)
+        > tuple_(after_seq, after_id),
+    )
+    stmt = union_all(changed, removed).order_by("seq", "id").limit(limit + 1)
+    rows = list((await session.execute(stmt)).all())
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more:
+        next_token = encode_sync_token(rows[-1].seq, rows[-1].id)
     else:
-        raise HTTPException(status_code=400, detail="Uncorrect owner type")
+        # (upper, 0) - всё с seq >= upper: id задач положительные
+        next_token = encode_sync_token(max(upper, after_seq), 0)
+
+    changed_ids = [row.id for row in rows if not row.deleted]
+    changes = []
+    if changed_ids:
+        result = await session.execute(
+            select(*task_columns)
+            .where(
+                Task.id == ids_param(changed_ids),
+                *task_scope(user, owner_type, room_id),
+            )
+            .order_by(Task.change_seq, Task.id)
+        )
+        changes = list(result.all())
+    return {
+        "changes": changes,
+        "deleted": [row.id for row in rows if row.deleted],
+        "next_token": next_token,
+        "has_more": has_more,
+    }
+
+
+async def get_task(
+    session: AsyncSession,
+    task_id: int,
+    user: Principal,
+    owner_type: OwnerType = OwnerType.USER,
+    room_id: int = None,
+):
+    stmt = select(Task).where(
+        Task.id == task_id, *task_scope(user, owner_type, room_id)
+    )
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
 
+async def update_task_returning(
+    session: AsyncSession,
+    user: Principal,
+    task_id: int,
+    scope: tuple,
+    values: dict,
+    *conditions,
+    event: str = "task_updated",
+) -> Task | None:
+    # Условия перехода проверяются в WHERE, поэтому переход атомарный
+    stmt = (
+        update(Task)
+        .where(Task.id == task_id, *scope, *conditions)
+        .values(**values)
+        .returning(Task)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    result = await session.execute(stmt)
+    task = result.scalar_one_or_none()
+    await session.commit()
+    if task is not None:
+        await task_changed(task, event, user)
+    return task
+
+
+async def get_task_row(session: AsyncSession, task_id: int, user: Principal):
+    stmt = select(*task_columns).where(Task.id == task_id, *task_scope(user))
+    row = (await session.execute(stmt)).one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Task with id:{task_id} not found")
+    return row
+
+
 async def get_task_by_id(
     task_id: Annotated[int, Path],
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     session: AsyncSession = Depends(db_helper.session_dependency),
 ):
     task = await get_task(session=session, task_id=task_id, user=user)
@@ -102,42 +339,88 @@ async def get_task_by_id(
     raise HTTPException(status_code=404, detail=f"Task with id:{task_id} not found")
 
 
-async def patch_task(
-    session: AsyncSession, update_task: UpdateTask, task: Task
-) -> Task:
+def _update_values(update_task: UpdateTask) -> dict:
     data = update_task.model_dump(exclude_unset=True)
-    for k, v in data.items():
-        setattr(task, k, v)
     if "completed" in data:
-        task.completed_at = datetime.now() if task.completed else None
-    await session.commit()
-    await session.refresh(task)
+        data["completed_at"] = func.now() if data["completed"] else None
+    return data
+
+
+async def patch_task(
+    session: AsyncSession, update_task: UpdateTask, user: Principal, task_id: int
+) -> Task:
+    values = _update_values(update_task)
+    if not values:
+        task = await get_task(session=session, task_id=task_id, user=user)
+    else:
+        task = await update_task_returning(
+            session, user, task_id, task_scope(user), values
+        )
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task with id:{task_id} not found")
     return task
 
 
-async def patch_completed_task(session: AsyncSession, is_completed: bool, task: Task):
-    setattr(task, "completed", is_completed)
+async def patch_completed_task(
+    session: AsyncSession, is_completed: bool, user: Principal, task_id: int
+):
+    values = {"completed": is_completed}
     if is_completed:
-        setattr(task, "completed_at", datetime.now())
-    await session.commit()
-    await session.refresh(task)
+        values["completed_at"] = func.now()
+    task = await update_task_returning(
+        session, user, task_id, task_scope(user), values, event="task_completed"
+    )
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task with id:{task_id} not found")
     return task
 
 
-async def delete_task(session: AsyncSession, task: Task) -> None:
+async def delete_task(
+    session: AsyncSession, task: Task, user: Principal | None = None
+) -> None:
     await session.delete(task)
     await session.commit()
+    await task_changed(task, "task_deleted", user)
 
 
-async def get_room_member(session: AsyncSession, user: User, room: Room):
-    return await session.execute(
-        select(Room_Member).where(
-            Room_Member.room_id == room.id, Room_Member.user_id == user.id
-        )
+def room_roles_query(room_id: int) -> Select:
+    # NULL вместо участника - пустая, но существующая комната
+    return (
+        select(Room_Member.user_id, Room_Member.role)
+        .select_from(Room)
+        .outerjoin(Room_Member, Room_Member.room_id == Room.id)
+        .where(Room.id == room_id)
     )
 
 
-async def create_room_and_creator(session: AsyncSession, room: CreateRoom, user: User):
+async def get_room_role(
+    session: AsyncSession, members: RoomMembersCache, room_id: int, user_id: int
+) -> Roles | None:
+    loaded, role = await members.get(room_id, user_id)
+    if loaded:
+        return Roles(role) if role is not None else None
+    # Версия читается до запроса: invalidate во время чтения отменит запись
+    version = await members.version(room_id)
+    result = await session.execute(room_roles_query(room_id))
+    rows = result.all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Room not found")
+    roles = {
+        member_id: member_role
+        for member_id, member_role in rows
+        if member_id is not None
+    }
+    await members.load(
+        room_id,
+        {member_id: member_role.value for member_id, member_role in roles.items()},
+        version,
+    )
+    return roles.get(user_id)
+
+
+async def create_room_and_creator(
+    session: AsyncSession, room: CreateRoom, user: Principal, members: RoomMembersCache
+):
     new_room = Room(**room.model_dump(), created_by=user.id)
     session.add(new_room)
     await session.flush()
@@ -148,11 +431,18 @@ async def create_room_and_creator(session: AsyncSession, room: CreateRoom, user:
     await session.commit()
     await session.refresh(new_room)
     await session.refresh(new_room_creator)
+    await members.load(new_room.id, {user.id: Roles.CREATOR.value})
     return new_room
 
 
 async def get_all_tasks_from_room(
-    session: AsyncSession, user: User, room_id: int, order_by: str
+    session: AsyncSession,
+    user: Principal,
+    room_id: int,
+    order_by: str,
+    cursor: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: tuple[str, ...] | None = None,
 ):
     tasks = await get_all_tasks(
         session=session,
@@ -160,24 +450,15 @@ async def get_all_tasks_from_room(
         owner_type=OwnerType.ROOM,
         room_id=room_id,
         order_by=order_by,
+        cursor=cursor,
+        limit=limit,
+        fields=fields,
     )
     return tasks
 
 
-async def assign_task_from_room_by_id(
-    session: AsyncSession, user: User, room_id: int, task_id: int
-):
-    task = await get_task(session=session, task_id=task_id, user=user, room_id=room_id)
-    if task is not None:
-        setattr(task, "assigned_id", user.id)
-        await session.commit()
-        await session.refresh(task)
-        return {"detail": f"Task was assigned by user with id {user.id}"}
-    raise HTTPException(status_code=404, detail=f"Task with {task_id} id not found.")
-
-
 async def get_task_from_room_by_id(
-    session: AsyncSession, user: User, room_id: int, task_id: int
+    session: AsyncSession, user: Principal, room_id: int, task_id: int
 ):
     task = await get_task(session=session, task_id=task_id, user=user, room_id=room_id)
     if task is not None:
@@ -187,144 +468,373 @@ async def get_task_from_room_by_id(
 
 async def create_task_in_room(
     session: AsyncSession,
-    user: User,
+    user: Principal,
     task_in: CreateTask,
-    room: Room,
-    room_member: Room_Member,
+    room_id: int,
+    role: Roles,
 ):
-    if room_member.role == Roles.CREATOR or room_member.role == Roles.ADMIN:
+    if role == Roles.CREATOR or role == Roles.ADMIN:
         task = Task(
             **task_in.model_dump(),
-            room_id=room.id,
+            room_id=room_id,
             owner_type=OwnerType.ROOM,
             user_id=user.id,
         )
         session.add(task)
         await session.commit()
         await session.refresh(task)
+        await task_changed(task, "task_created", user)
         return task
     raise HTTPException(status_code=403, detail="Doesn't have permissions")
 
 
 async def only_complete_task_in_room(
-    session: AsyncSession, user: User, room: Room, task_id: int
+    session: AsyncSession, user: Principal, room_id: int, task_id: int
 ):
-    task = await get_task(
-        session=session,
-        task_id=task_id,
-        user=user,
-        owner_type=OwnerType.ROOM,
-        room_id=room.id,
+    scope = task_scope(user, OwnerType.ROOM, room_id)
+    task = await update_task_returning(
+        session,
+        user,
+        task_id,
+        scope,
+        {"completed": True, "completed_at": func.now()},
+        Task.assigned_id == user.id,
+        event="task_completed",
     )
-    if task is None:
+    if task is not None:
+        return task
+    if await get_task(session, task_id, user, OwnerType.ROOM, room_id) is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    if task.assigned_id is None or not task.assigned_id == user.id:
-        raise HTTPException(status_code=403, detail="Don't accept this task")
-    setattr(task, "completed", True)
-    setattr(task, "completed_at", datetime.now())
-    await session.commit()
-    await session.refresh(task)
-    return task
+    raise HTTPException(status_code=403, detail="Don't accept this task")
 
 
 async def patch_task_in_room(
     session: AsyncSession,
-    user: User,
-    room: Room,
-    room_member: Room_Member,
+    user: Principal,
+    room_id: int,
+    role: Roles,
     task_in: UpdateTask,
     task_id: int,
 ):
-    if room_member.role == Roles.MEMBER:
+    if role == Roles.MEMBER:
         raise HTTPException(status_code=403, detail="Doesn't have permissions")
-    task = await get_task(
-        session, task_id, user, room_id=room.id, owner_type=OwnerType.ROOM
-    )
+    values = _update_values(task_in)
+    if not values:
+        task = await get_task(session, task_id, user, OwnerType.ROOM, room_id)
+    else:
+        task = await update_task_returning(
+            session, user, task_id, task_scope(user, OwnerType.ROOM, room_id), values
+        )
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    await patch_task(session=session, task=task, update_task=task_in)
     return task
 
 
 async def accept_task(
     session: AsyncSession,
-    user: User,
-    room: Room,
+    user: Principal,
+    room_id: int,
     task_id: int,
 ):
-    task = await get_task(
-        session, task_id, user, owner_type=OwnerType.ROOM, room_id=room.id
+    task = await update_task_returning(
+        session,
+        user,
+        task_id,
+        task_scope(user, OwnerType.ROOM, room_id),
+        {"assigned_id": user.id},
+        Task.assigned_id.is_(None),
+        event="task_accepted",
     )
-    if task.assigned_id is not None:
-        raise HTTPException(status_code=409, detail="Task is already accept")
-    task.assignee = user
-    await session.commit()
-    await session.refresh(task)
-    return task
+    if task is not None:
+        return task
+    if await get_task(session, task_id, user, OwnerType.ROOM, room_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    raise HTTPException(status_code=409, detail="Task is already accept")
 
 
 async def delete_task_in_room(
     session: AsyncSession,
-    room_member: Room_Member,
-    user: User,
+    role: Roles,
+    user: Principal,
     task_id: int,
-    room: Room,
+    room_id: int,
 ):
-    if room_member.role == Roles.MEMBER:
+    if role == Roles.MEMBER:
         raise HTTPException(status_code=403, detail="Doesn't have permissions")
     task = await get_task(
         session=session,
         task_id=task_id,
-        user=User,
+        user=user,
         owner_type=OwnerType.ROOM,
-        room_id=room.id,
+        room_id=room_id,
     )
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    await delete_task(session=session, task=task)
+    await delete_task(session=session, task=task, user=user)
 
 
 async def create_invite_link(
     room_id: int,
-    room_member: Room_Member,
+    role: Roles,
     cache: InvitesCodesCaches,
+    max_uses: int | None = None,
 ):
-    if room_member.role == Roles.MEMBER:
+    if role == Roles.MEMBER:
         raise HTTPException(status_code=403, detail="Doesn't have permissions")
-    if cache.get(str(room_id)) is not None:
-        await cache.delete(str(room_id))
     invite_code = str(uuid4())
-    await cache.set(room_id=room_id, value=invite_code)
+    await cache.set(room_id=room_id, value=invite_code, max_uses=max_uses)
     return f"tasks/rooms/{room_id}/{invite_code}"
 
 
 async def join_to_room(
     room_id: int,
     invite_code: str,
-    user: User,
+    user: Principal,
     session: AsyncSession,
     cache: InvitesCodesCaches,
+    members: RoomMembersCache,
 ):
-    room = await session.get(Room, room_id)
-    if room is None:
-        raise HTTPException(status_code=404, detail="Room not found")
-    code = await cache.get(str(room_id))
-    if code is None or code != invite_code:
-        raise HTTPException(status_code=403, detail="Invalid code")
-    member = await get_room_member(session, user, room)
-    if member.scalar_one_or_none() is not None:
+    role = await get_room_role(session, members, room_id, user.id)
+    if role is not None:
+        raise HTTPException(status_code=403, detail="User already room member")
+    # Вставка до списания: повторное вступление упрётся в uq_room_members_room_user
+    # и не потратит приглашение
+    member_id = await session.scalar(
+        pg_insert(Room_Member)
+        .values(room_id=room_id, user_id=user.id, role=Roles.MEMBER)
+        .on_conflict_do_nothing(index_elements=["room_id", "user_id"])
+        .returning(Room_Member.id)
+    )
+    if member_id is None:
         raise HTTPException(status_code=403, detail="User already room member")
-    new_room_member = Room_Member(room_id=room_id, role=Roles.MEMBER, user=user)
-    session.add(new_room_member)
+    if not await cache.redeem(room_id, invite_code):
+        await session.rollback()
+        raise HTTPException(status_code=403, detail="Invalid code")
     await session.commit()
-    await session.refresh(new_room_member)
+    await members.add(room_id, user.id, Roles.MEMBER.value)
 
 
 async def delete_invite_link(
     room_id: int,
     cache: InvitesCodesCaches,
-    room_member: Room_Member,
+    role: Roles,
 ):
-    if room_member.role not in (Roles.ADMIN, Roles.CREATOR):
+    if role not in (Roles.ADMIN, Roles.CREATOR):
         raise HTTPException(status_code=403, detail="Doesn't have permissions")
     await cache.delete(str(room_id))
+
+
+def ids_param(ids: list[int]):
+    return any_(literal(list(ids), ARRAY(Integer)))
+
+
+# insertmanyvalues режет INSERT по 1000 строк; батч - одна страница:
+# 7 параметров на строку укладываются в лимит Postgres в 32767
+BATCH_INSERT_PAGE_SIZE = MAX_BATCH_SIZE
+BATCH_INSERT_PAGES = -(-MAX_BATCH_SIZE // BATCH_INSERT_PAGE_SIZE)
+
+
+def _batch_result(
+    ids: list[int],
+    done: set,
+    status: str,
+    forbidden: set = frozenset(),
+    unchanged: set = frozenset(),
+):
+    def item_status(task_id: int) -> str:
+        if task_id in done:
+            return status
+        if task_id in unchanged:
+            return "unchanged"
+        if task_id in forbidden:
+            return "forbidden"
+        return "not_found"
+
+    return {
+        "items": [{"id": task_id, "status": item_status(task_id)} for task_id in ids]
+    }
+
+
+async def create_tasks_batch(
+    session: AsyncSession,
+    user: Principal,
+    items: list[CreateTask],
+    owner_type: OwnerType = OwnerType.USER,
+    room_id: int | None = None,
+):
+    rows = [
+        {
+            **item.model_dump(),
+            "user_id": user.id,
+            "owner_type": owner_type,
+            "room_id": room_id,
+        }
+        for item in items
+    ]
+    result = await session.execute(
+        insert(Task)
+        .returning(Task.id, sort_by_parameter_order=True)
+        .execution_options(insertmanyvalues_page_size=BATCH_INSERT_PAGE_SIZE),
+        rows,
+    )
+    ids = list(result.scalars().all())
+    await session.commit()
+    await tasks_changed(
+        owner_type, scope_id(user, owner_type, room_id), "task_created", ids, user
+    )
+    return _batch_result(ids, set(ids), "created")
+
+
+async def patch_tasks_batch(
+    session: AsyncSession,
+    user: Principal,
+    items: list[BatchUpdateTask],
+    owner_type: OwnerType = OwnerType.USER,
+    room_id: int | None = None,
+):
+    scope = task_scope(user, owner_type, room_id)
+    ids = [item.id for item in items]
+    found = set(
+        (
+            await session.scalars(
+                select(Task.id)
+                .where(Task.id == ids_param(ids), *scope)
+                .with_for_update()
+            )
+        ).all()
+    )
+    now = datetime.now(timezone.utc)
+    params = []
+    for item in items:
+        if item.id not in found:
+            continue
+        values = item.model_dump(exclude_unset=True, exclude={"id"})
+        if "completed" in values:
+            values["completed_at"] = now if values["completed"] else None
+        if values:
+            params.append({"id": item.id, **values})
+    if params:
+        await session.execute(update(Task), params)
+    await session.commit()
+    if params:
+        await tasks_changed(
+            owner_type,
+            scope_id(user, owner_type, room_id),
+            "task_updated",
+            [param["id"] for param in params],
+            user,
+        )
+    updated = {param["id"] for param in params}
+    return _batch_result(ids, updated, "updated", unchanged=found - updated)
+
+
+async def complete_tasks_batch(
+    session: AsyncSession,
+    user: Principal,
+    ids: list[int],
+    owner_type: OwnerType = OwnerType.USER,
+    room_id: int | None = None,
+    *conditions,
+):
+    scope = task_scope(user, owner_type, room_id)
+    stmt = (
+        update(Task)
+        .where(Task.id == ids_param(ids), *scope, *conditions)
+        .values(completed=True, completed_at=func.now())
+        .returning(Task.id)
+        .execution_options(synchronize_session=False)
+    )
+    done = set((await session.scalars(stmt)).all())
+    forbidden = set()
+    if conditions and len(done) < len(set(ids)):
+        missing = [task_id for task_id in ids if task_id not in done]
+        forbidden = set(
+            (
+                await session.scalars(
+                    select(Task.id).where(Task.id == ids_param(missing), *scope)
+                )
+            ).all()
+        )
+    await session.commit()
+    if done:
+        await tasks_changed(
+            owner_type,
+            scope_id(user, owner_type, room_id),
+            "task_completed",
+            done,
+            user,
+        )
+    return _batch_result(ids, done, "completed", forbidden)
+
+
+async def delete_tasks_batch(
+    session: AsyncSession,
+    user: Principal,
+    ids: list[int],
+    owner_type: OwnerType = OwnerType.USER,
+    room_id: int | None = None,
+):
+    scope = task_scope(user, owner_type, room_id)
+    stmt = (
+        delete(Task)
+        .where(Task.id == ids_param(ids), *scope)
+        .returning(Task.id)
+        .execution_options(synchronize_session=False)
+    )
+    done = set((await session.scalars(stmt)).all())
+    await session.commit()
+    if done:
+        await tasks_changed(
+            owner_type, scope_id(user, owner_type, room_id), "task_deleted", done, user
+        )
+    return _batch_result(ids, done, "deleted")
+
+
+async def create_tasks_batch_in_room(
+    session: AsyncSession,
+    user: Principal,
+    items: list[CreateTask],
+    room_id: int,
+    role: Roles,
+):
+    if role not in (Roles.CREATOR, Roles.ADMIN):
+        raise HTTPException(status_code=403, detail="Doesn't have permissions")
+    return await create_tasks_batch(
+        session, user, items, owner_type=OwnerType.ROOM, room_id=room_id
+    )
+
+
+async def patch_tasks_batch_in_room(
+    session: AsyncSession,
+    user: Principal,
+    items: list[BatchUpdateTask],
+    room_id: int,
+    role: Roles,
+):
+    if role == Roles.MEMBER:
+        raise HTTPException(status_code=403, detail="Doesn't have permissions")
+    return await patch_tasks_batch(
+        session, user, items, owner_type=OwnerType.ROOM, room_id=room_id
+    )
+
+
+async def complete_tasks_batch_in_room(
+    session: AsyncSession, user: Principal, ids: list[int], room_id: int
+):
+    return await complete_tasks_batch(
+        session, user, ids, OwnerType.ROOM, room_id, Task.assigned_id == user.id
+    )
+
+
+async def delete_tasks_batch_in_room(
+    session: AsyncSession,
+    user: Principal,
+    ids: list[int],
+    room_id: int,
+    role: Roles,
+):
+    if role == Roles.MEMBER:
+        raise HTTPException(status_code=403, detail="Doesn't have permissions")
+    return await delete_tasks_batch(
+        session, user, ids, owner_type=OwnerType.ROOM, room_id=room_id
+    )
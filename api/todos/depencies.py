@@ -1,35 +1,46 @@
+from dataclasses import dataclass
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, Path
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.todos.crud import get_room_member
-from api.todos.schemas import GetRoom
-from core.models import User, db_helper, Room, Room_Member
-from core.security import get_current_user
+from api.todos.crud import get_room_role
+from core.models import db_helper
+from core.models.db_helper import ReadSessions
+from core.models.redis_helper import RoomMembersCache, get_room_members_cache
+from core.models.room_member import Roles
+from core.security import Principal, get_current_user
 
 
-async def get_current_room(
-    room_id: Annotated[int, Path],
-    user=Depends(get_current_user),
-    session: AsyncSession = Depends(db_helper.session_dependency),
-):
-    room = await session.execute(select(Room).where(Room.id == room_id))
-    room = room.scalar_one_or_none()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-
-    room_member = await get_room_member(session, user, room)
-    if not room_member:
+@dataclass(frozen=True, slots=True)
+class RoomContext:
+    user: Principal
+    room_id: int
+    role: Roles
+
+
+async def load_room_context(
+    session: AsyncSession, members: RoomMembersCache, user: Principal, room_id: int
+) -> RoomContext:
+    role = await get_room_role(session, members, room_id, user.id)
+    if role is None:
         raise HTTPException(status_code=403, detail="Not a room member")
-    return room
+    return RoomContext(user=user, room_id=room_id, role=role)
 
 
-async def get_user_as_member_of_room(
-    room=Depends(get_current_room),
-    user=Depends(get_current_user),
+async def get_room_context(
+    room_id: Annotated[int, Path],
+    user: Principal = Depends(get_current_user),
     session: AsyncSession = Depends(db_helper.session_dependency),
-):
-    room_member = await get_room_member(session, user, room)
-    return room_member.scalar_one_or_none()
+    members: RoomMembersCache = Depends(get_room_members_cache),
+) -> RoomContext:
+    return await load_room_context(session, members, user, room_id)
+
+
+async def get_read_room_context(
+    room_id: Annotated[int, Path],
+    user: Principal = Depends(get_current_user),
+    reads: ReadSessions = Depends(db_helper.read_sessions_dependency),
+    members: RoomMembersCache = Depends(get_room_members_cache),
+) -> RoomContext:
+    return await load_room_context(reads.session(), members, user, room_id)
@@ -0,0 +1,62 @@
+import csv
+import io
+from typing import AsyncIterator, Literal
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.config import setting
+from core.models.tasks import Task
+
+ExportFormat = Literal["ndjson", "csv"]
+
+export_columns = (
+    Task.id,
+    Task.title,
+    Task.description,
+    Task.completed,
+    Task.created_at,
+    Task.due_at,
+    Task.completed_at,
+    Task.room_id,
+    Task.assigned_id,
+)
+media_types = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _render_ndjson(rows) -> bytes:
+    return b"".join(orjson.dumps(row._asdict()) + b"\n" for row in rows)
+
+
+def _render_csv(rows, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow([column.key for column in export_columns])
+    writer.writerows(
+        [value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def export_tasks(
+    scope: tuple, fmt: ExportFormat, session_factory: async_sessionmaker
+) -> AsyncIterator[bytes]:
+    stmt = (
+        select(*export_columns)
+        .where(*scope)
+        .order_by(Task.id)
+        .execution_options(yield_per=setting.export_fetch_size)
+    )
+    # Своя сессия: генератор живёт дольше обработчика запроса
+    async with session_factory() as session:
+        result = await session.stream(stmt)
+        if fmt == "csv":
+            yield _render_csv([], header=True)
+        async for rows in result.partitions():
+            if fmt == "csv":
+                yield _render_csv(rows)
+            else:
+                yield _render_ndjson(rows)
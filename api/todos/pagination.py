@@ -0,0 +1,128 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, or_, tuple_
+
+from core.models.tasks import Task
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+ordering_columns = {
+    "created_at": Task.created_at,
+    "completed_at": Task.completed_at,
+    "due_at": Task.due_at,
+    "completed": Task.completed,
+}
+
+
+def parse_ordering(order_by: str) -> tuple[str, bool]:
+    descending = order_by.startswith("-")
+    field = order_by[1:] if descending else order_by
+    if field not in ordering_columns:
+        raise HTTPException(status_code=400, detail="Invalid ordering category")
+    return field, descending
+
+
+def _encode_token(data: dict) -> str:
+    raw = json.dumps(data)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_token(token: str) -> dict:
+    raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    data = json.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("Token must be an object")
+    return data
+
+
+def encode_cursor(order_by: str, value, task_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return _encode_token({"o": order_by, "v": value, "id": task_id})
+
+
+def decode_cursor(cursor: str, order_by: str) -> tuple:
+    try:
+        data = _decode_token(cursor)
+        task_id = int(data["id"])
+        value = data["v"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if data.get("o") != order_by:
+        raise HTTPException(status_code=400, detail="Cursor doesn't match ordering")
+    field, _ = parse_ordering(order_by)
+    if value is not None and field != "completed":
+        try:
+            value = datetime.fromisoformat(value)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, task_id
+
+
+def _after(column, descending: bool, value, task_id: int):
+    if not column.nullable:
+        if descending:
+            return tuple_(column, Task.id) < tuple_(value, task_id)
+        return tuple_(column, Task.id) > tuple_(value, task_id)
+    # Postgres: NULL идут последними при ASC и первыми при DESC
+    if descending:
+        if value is None:
+            return or_(and_(column.is_(None), Task.id < task_id), column.is_not(None))
+        return tuple_(column, Task.id) < tuple_(value, task_id)
+    if value is None:
+        return and_(column.is_(None), Task.id > task_id)
+    return or_(tuple_(column, Task.id) > tuple_(value, task_id), column.is_(None))
+
+
+def paginate(stmt: Select, order_by: str, cursor: str | None, limit: int) -> Select:
+    field, descending = parse_ordering(order_by)
+    column = ordering_columns[field]
+    if cursor is not None:
+        value, task_id = decode_cursor(cursor, order_by)
+        stmt = stmt.where(_after(column, descending, value, task_id))
+    if descending:
+        stmt = stmt.order_by(column.desc(), Task.id.desc())
+    else:
+        stmt = stmt.order_by(column.asc(), Task.id.asc())
+    return stmt.limit(limit + 1)
+
+
+def next_cursor(tasks: list, order_by: str, limit: int) -> str | None:
+    if len(tasks) <= limit:
+        return None
+    field, _ = parse_ordering(order_by)
+    last = tasks[limit - 1]
+    return encode_cursor(order_by, getattr(last, field), last.id)
+
+
+def encode_sync_token(change_seq: int, task_id: int) -> str:
+    return _encode_token({"s": change_seq, "id": task_id})
+
+
+def decode_sync_token(token: str | None) -> tuple[int, int]:
+    if token is None:
+        return 0, 0
+    try:
+        data = _decode_token(token)
+        return int(data["s"]), int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+
+def encode_search_cursor(query: str, rank: float, task_id: int) -> str:
+    return _encode_token({"q": query, "r": rank, "id": task_id})
+
+
+def decode_search_cursor(cursor: str, query: str) -> tuple[float, int]:
+    try:
+        data = _decode_token(cursor)
+        rank, task_id = float(data["r"]), int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if data.get("q") != query:
+        raise HTTPException(status_code=400, detail="Cursor doesn't match query")
+    return rank, task_id
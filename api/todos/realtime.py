@@ -0,0 +1,118 @@
+import asyncio
+import json
+import time
+
+import jwt
+from fastapi import HTTPException, WebSocket, WebSocketException
+from starlette.status import WS_1008_POLICY_VIOLATION, WS_1013_TRY_AGAIN_LATER
+
+from api.todos.crud import get_room_role
+from api.todos.depencies import RoomContext, load_room_context
+from core.models import db_helper
+from core.models.redis_helper import (
+    MEMBERS_CHANGED,
+    RoomEventBus,
+    get_principal_cache,
+    get_refresh_tokens,
+    get_room_members_cache,
+)
+from core.security import decode_jwt_token, get_principal_by_token
+
+SUBPROTOCOL = "bearer"
+
+
+def socket_token(websocket: WebSocket) -> str | None:
+    # Браузер не передаёт Authorization, а query-строка оседает в логах доступа
+    protocols = websocket.scope.get("subprotocols") or []
+    if len(protocols) == 2 and protocols[0] == SUBPROTOCOL:
+        return protocols[1]
+    return None
+
+
+async def authenticate_room_socket(
+    token: str | None, room_id: int
+) -> tuple[RoomContext, dict]:
+    if not token:
+        raise WebSocketException(code=WS_1008_POLICY_VIOLATION, reason="Token missing")
+    # Зависимость с yield держала бы соединение из пула всё время жизни сокета
+    async with db_helper.session_factory() as session:
+        try:
+            payload = decode_jwt_token(token)
+            user = await get_principal_by_token(
+                session, get_principal_cache(), get_refresh_tokens(), token
+            )
+            context = await load_room_context(
+                session, get_room_members_cache(), user, room_id
+            )
+        except (HTTPException, jwt.PyJWTError):
+            raise WebSocketException(code=WS_1008_POLICY_VIOLATION)
+    return context, payload
+
+
+async def _is_member(context: RoomContext) -> bool:
+    async with db_helper.session_factory() as session:
+        try:
+            role = await get_room_role(
+                session, get_room_members_cache(), context.room_id, context.user.id
+            )
+        except HTTPException:
+            return False
+    return role is not None
+
+
+def _concerns(event: str, user_id: int) -> bool:
+    if MEMBERS_CHANGED not in event:
+        return False
+    data = json.loads(event)
+    return data.get("type") == MEMBERS_CHANGED and data.get("user_id") in (
+        None,
+        user_id,
+    )
+
+
+async def _send_events(
+    websocket: WebSocket, queue: asyncio.Queue, context: RoomContext
+):
+    while (event := await queue.get()) is not None:
+        if _concerns(event, context.user.id) and not await _is_member(context):
+            await websocket.close(code=WS_1008_POLICY_VIOLATION)
+            return
+        await websocket.send_text(event)
+    await websocket.close(code=WS_1013_TRY_AGAIN_LATER)
+
+
+async def _wait_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def _wait_expiry(expires_at: float):
+    await asyncio.sleep(max(0.0, expires_at - time.time()))
+
+
+async def stream_room_events(
+    websocket: WebSocket, events: RoomEventBus, context: RoomContext, payload: dict
+):
+    queue = await events.subscribe(context.room_id)
+    try:
+        await websocket.accept(subprotocol=SUBPROTOCOL)
+        auth_lost = {asyncio.create_task(_wait_expiry(payload["exp"]))}
+        if payload.get("fam"):
+            auth_lost.add(
+                asyncio.create_task(get_refresh_tokens().wait_revoked(payload["fam"]))
+            )
+        tasks = {
+            asyncio.create_task(_send_events(websocket, queue, context)),
+            asyncio.create_task(_wait_disconnect(websocket)),
+            *auth_lost,
+        }
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if done & auth_lost:
+            await websocket.close(code=WS_1008_POLICY_VIOLATION)
+    finally:
+        await events.unsubscribe(context.room_id, queue)
@@ -1,6 +1,8 @@
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+MAX_BATCH_SIZE = 2000
 
 
 class BaseTask(BaseModel):
@@ -14,12 +16,38 @@ class CreateTask(BaseTask):
 
 
 class GetTask(BaseTask):
+    id: int
     created_at: datetime
     completed_at: datetime | None
     due_at: datetime | None
+    room_id: int | None = None
+    assigned_id: int | None = None
     model_config = ConfigDict(from_attributes=True)
 
 
+class TaskPage(BaseModel):
+    items: list[GetTask]
+    next_cursor: str | None = None
+
+
+class TaskSearchHit(GetTask):
+    rank: float
+    title_highlight: str
+    description_highlight: str
+
+
+class TaskSearchPage(BaseModel):
+    items: list[TaskSearchHit]
+    next_cursor: str | None = None
+
+
+class TaskChanges(BaseModel):
+    changes: list[GetTask]
+    deleted: list[int]
+    next_token: str
+    has_more: bool
+
+
 class UpdateTask(BaseModel):
     title: str | None = None
     description: str | None = None
@@ -31,6 +59,38 @@ class DeleteTask(BaseTask):
     pass
 
 
+class BatchCreateTasks(BaseModel):
+    items: list[CreateTask] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class BatchUpdateTask(UpdateTask):
+    id: int
+
+
+class BatchUpdateTasks(BaseModel):
+    items: list[BatchUpdateTask] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+    @field_validator("items")
+    @classmethod
+    def unique_ids(cls, items: list[BatchUpdateTask]) -> list[BatchUpdateTask]:
+        if len({item.id for item in items}) != len(items):
+            raise ValueError("Task ids must be unique")
+        return items
+
+
+class BatchTaskIds(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class BatchItemResult(BaseModel):
+    id: int
+    status: str
+
+
+class BatchResult(BaseModel):
+    items: list[BatchItemResult]
+
+
 class BaseRoom(BaseModel):
     name: str
 
@@ -40,6 +100,7 @@ class CreateRoom(BaseRoom):
 
 
 class GetRoom(BaseRoom):
-    created_by: datetime
-    created_at: datetime | None
+    id: int
+    created_by: int
+    created_at: datetime
     model_config = ConfigDict(from_attributes=True)
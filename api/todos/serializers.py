@@ -0,0 +1,77 @@
+from functools import lru_cache
+
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from pydantic import ConfigDict, TypeAdapter, create_model
+
+from api.todos.schemas import GetTask, TaskChanges, TaskPage, TaskSearchPage
+from core.models.tasks import Task
+
+task_columns = tuple(getattr(Task, name) for name in GetTask.model_fields)
+
+task_adapter = TypeAdapter(GetTask)
+task_page_adapter = TypeAdapter(TaskPage)
+task_changes_adapter = TypeAdapter(TaskChanges)
+task_search_page_adapter = TypeAdapter(TaskSearchPage)
+
+
+def render_task(row) -> ORJSONResponse:
+    task = task_adapter.validate_python(row, from_attributes=True)
+    return ORJSONResponse(task_adapter.dump_python(task))
+
+
+def parse_fields(fields: str | None = None) -> tuple[str, ...] | None:
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - GetTask.model_fields.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    # Порядок как в GetTask: одинаковые наборы дают один ключ кэша и один адаптер
+    requested.add("id")
+    return tuple(name for name in GetTask.model_fields if name in requested)
+
+
+def fields_columns(fields: tuple[str, ...] | None, *required: str) -> tuple:
+    if fields is None:
+        return task_columns
+    names = set(fields) | set(required)
+    return tuple(getattr(Task, name) for name in GetTask.model_fields if name in names)
+
+
+@lru_cache(maxsize=128)
+def fields_page_adapter(fields: tuple[str, ...]) -> TypeAdapter:
+    item = create_model(
+        "TaskFields",
+        __config__=ConfigDict(from_attributes=True),
+        **{
+            name: (GetTask.model_fields[name].annotation, GetTask.model_fields[name])
+            for name in fields
+        },
+    )
+    page = create_model(
+        "TaskFieldsPage",
+        items=(list[item], ...),
+        next_cursor=(str | None, None),
+    )
+    return TypeAdapter(page)
+
+
+def render_task_page(
+    page: dict, fields: tuple[str, ...] | None = None
+) -> ORJSONResponse:
+    adapter = task_page_adapter if fields is None else fields_page_adapter(fields)
+    validated = adapter.validate_python(page, from_attributes=True)
+    return ORJSONResponse(adapter.dump_python(validated))
+
+
+def render_task_changes(changes: dict) -> ORJSONResponse:
+    validated = task_changes_adapter.validate_python(changes, from_attributes=True)
+    return ORJSONResponse(task_changes_adapter.dump_python(validated))
+
+
+def render_task_search_page(page: dict) -> ORJSONResponse:
+    validated = task_search_page_adapter.validate_python(page, from_attributes=True)
+    return ORJSONResponse(task_search_page_adapter.dump_python(validated))
@@ -1,10 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, Query, Response, WebSocket
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.status import HTTP_201_CREATED, HTTP_204_NO_CONTENT
 
-from core.models.redis_helper import get_invites_codes_cache
-from core.models.users import User
-from core.security import get_current_user
+from core.models.redis_helper import (
+    RoomEventBus,
+    RoomMembersCache,
+    TaskListCache,
+    get_room_events,
+    get_invites_codes_cache,
+    get_room_members_cache,
+    get_task_list_cache,
+)
+from core.query_budget import query_budget
+from core.security import Principal, get_current_user
 from .crud import (
     get_task_by_id,
     create_room_and_creator,
@@ -15,62 +24,258 @@ from .crud import (
     accept_task,
     delete_task_in_room,
 )
-from api.todos.schemas import CreateTask, UpdateTask, GetTask, CreateRoom
+from api.todos.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from api.todos.schemas import (
+    CreateTask,
+    UpdateTask,
+    GetTask,
+    CreateRoom,
+    GetRoom,
+    BatchCreateTasks,
+    BatchUpdateTasks,
+    BatchTaskIds,
+    BatchResult,
+    TaskPage,
+    TaskChanges,
+    TaskSearchPage,
+)
+from api.todos.conditional import etag_matches, make_etag, not_modified, with_etag
+from api.todos.serializers import (
+    parse_fields,
+    render_task,
+    render_task_changes,
+    render_task_page,
+    render_task_search_page,
+)
 from core.models import Task
-from core.models.db_helper import db_helper
-from api.todos import crud
-from .depencies import get_current_room, get_user_as_member_of_room
+from core.models.tasks import OwnerType
+from core.models.db_helper import ReadSessions, db_helper
+from api.todos import crud, export, realtime
+from api.todos.export import ExportFormat
+from .depencies import RoomContext, get_read_room_context, get_room_context
 
 router = APIRouter()
 
 
-@router.get("/")
+async def _read_through(
+    cache: TaskListCache,
+    reads: ReadSessions,
+    owner_type: OwnerType,
+    owner_id: int,
+    parts: tuple,
+    if_none_match: str | None,
+    load,
+) -> Response:
+    scope = owner_type.value
+    generation, bumped_at = await cache.generation(scope, owner_id)
+    etag = make_etag(scope, owner_id, generation, *parts)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    cached = await cache.get(scope, owner_id, generation, *parts)
+    if cached is not None:
+        response = Response(content=cached, media_type="application/json")
+        return with_etag(response, etag)
+    # Реплика, ещё не видящая bump, положила бы старый ответ под новый ETag
+    response = await load(reads.session(fresh_since=bumped_at))
+    await cache.set(scope, owner_id, generation, response.body.decode(), *parts)
+    return with_etag(response, etag)
+
+
+async def _render_page(pending_page, fields: tuple[str, ...] | None = None) -> Response:
+    return render_task_page(await pending_page, fields)
+
+
+def _fields_part(fields: tuple[str, ...] | None) -> str:
+    return ",".join(fields) if fields else "*"
+
+
+async def _render_search_page(pending_page) -> Response:
+    return render_task_search_page(await pending_page)
+
+
+@router.get("/", response_model=TaskPage)
+@query_budget(1)
 async def get_all_tasks(
-    session: AsyncSession = Depends(db_helper.session_dependency),
+    reads: ReadSessions = Depends(db_helper.read_sessions_dependency),
     order_by: str = "created_at",
-    user: User = Depends(get_current_user),
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: tuple[str, ...] | None = Depends(parse_fields),
+    user: Principal = Depends(get_current_user),
+    cache: TaskListCache = Depends(get_task_list_cache),
+    if_none_match: str | None = Header(None),
 ):
-    return await crud.get_all_tasks(session=session, order_by=order_by, user=user)
+    return await _read_through(
+        cache,
+        reads,
+        OwnerType.USER,
+        user.id,
+        ("list", order_by, cursor, limit, _fields_part(fields)),
+        if_none_match,
+        lambda session: _render_page(
+            crud.get_all_tasks(
+                session=session,
+                order_by=order_by,
+                user=user,
+                cursor=cursor,
+                limit=limit,
+                fields=fields,
+            ),
+            fields,
+        ),
+    )
 
 
-@router.post("/", status_code=201)
+@router.post("/", response_model=GetTask, status_code=201)
+@query_budget(2)
 async def create_task(
     task: CreateTask,
     session: AsyncSession = Depends(db_helper.session_dependency),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ):
     return await crud.create_task(session=session, task_in=task, user=user)
 
 
-@router.get("/{task_id}")
+@router.post("/batch", response_model=BatchResult, status_code=201)
+@query_budget(crud.BATCH_INSERT_PAGES)
+async def create_tasks_batch(
+    batch: BatchCreateTasks,
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    user: Principal = Depends(get_current_user),
+):
+    return await crud.create_tasks_batch(session=session, user=user, items=batch.items)
+
+
+@router.patch("/batch", response_model=BatchResult)
+@query_budget(2)
+async def patch_tasks_batch(
+    batch: BatchUpdateTasks,
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    user: Principal = Depends(get_current_user),
+):
+    return await crud.patch_tasks_batch(session=session, user=user, items=batch.items)
+
+
+@router.post("/batch/completed", response_model=BatchResult)
+@query_budget(2)
+async def complete_tasks_batch(
+    batch: BatchTaskIds,
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    user: Principal = Depends(get_current_user),
+):
+    return await crud.complete_tasks_batch(session=session, user=user, ids=batch.ids)
+
+
+@router.post("/batch/delete", response_model=BatchResult)
+@query_budget(1)
+async def delete_tasks_batch(
+    batch: BatchTaskIds,
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    user: Principal = Depends(get_current_user),
+):
+    return await crud.delete_tasks_batch(session=session, user=user, ids=batch.ids)
+
+
+@router.get("/export")
+@query_budget(0)
+async def export_tasks(
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+    user: Principal = Depends(get_current_user),
+    reads: ReadSessions = Depends(db_helper.read_sessions_dependency),
+):
+    return StreamingResponse(
+        export.export_tasks(crud.task_scope(user), fmt, reads.factory()),
+        media_type=export.media_types[fmt],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{fmt}"'},
+    )
+
+
+@router.get("/search", response_model=TaskSearchPage)
+@query_budget(1)
+async def search_tasks(
+    q: str = Query(min_length=1, max_length=256),
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    reads: ReadSessions = Depends(db_helper.read_sessions_dependency),
+    user: Principal = Depends(get_current_user),
+    cache: TaskListCache = Depends(get_task_list_cache),
+    if_none_match: str | None = Header(None),
+):
+    return await _read_through(
+        cache,
+        reads,
+        OwnerType.USER,
+        user.id,
+        ("search", q, cursor, limit),
+        if_none_match,
+        lambda session: _render_search_page(
+            crud.search_tasks(
+                session=session, user=user, q=q, cursor=cursor, limit=limit
+            )
+        ),
+    )
+
+
+@router.get("/changes", response_model=TaskChanges)
+@query_budget(3)
+async def get_changes(
+    since: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    user: Principal = Depends(get_current_user),
+):
+    # Всегда primary: граница окна - снимок xmin, на реплике он свой
+    changes = await crud.get_changes(
+        session=session, user=user, since=since, limit=limit
+    )
+    return render_task_changes(changes)
+
+
+@router.get("/{task_id}", response_model=GetTask)
+@query_budget(1)
 async def get_task(
     task_id: int,
-    session: AsyncSession = Depends(db_helper.session_dependency),
-    user: User = Depends(get_current_user),
+    reads: ReadSessions = Depends(db_helper.read_sessions_dependency),
+    user: Principal = Depends(get_current_user),
+    cache: TaskListCache = Depends(get_task_list_cache),
+    if_none_match: str | None = Header(None),
 ):
-    return await crud.get_task_by_id(task_id=task_id, session=session, user=user)
+    async def load(session: AsyncSession):
+        row = await crud.get_task_row(task_id=task_id, session=session, user=user)
+        return render_task(row)
+
+    return await _read_through(
+        cache, reads, OwnerType.USER, user.id, ("task", task_id), if_none_match, load
+    )
 
 
 @router.patch("/{task_id}", response_model=GetTask)
+@query_budget(1)
 async def patch_task(
+    task_id: int,
     update_task: UpdateTask,
     session: AsyncSession = Depends(db_helper.session_dependency),
-    task: Task = Depends(get_task_by_id),
+    user: Principal = Depends(get_current_user),
 ):
-    return await crud.patch_task(session=session, update_task=update_task, task=task)
+    return await crud.patch_task(
+        session=session, update_task=update_task, user=user, task_id=task_id
+    )
 
 
 @router.post("/{task_id}/completed", status_code=204)
+@query_budget(1)
 async def patch_completed_task(
+    task_id: int,
     session: AsyncSession = Depends(db_helper.session_dependency),
-    task: Task = Depends(get_task_by_id),
+    user: Principal = Depends(get_current_user),
 ):
     return await crud.patch_completed_task(
-        session=session, task=task, is_completed=True
+        session=session, user=user, task_id=task_id, is_completed=True
     )
 
 
 @router.delete("/{task_id}")
+@query_budget(1)
 async def delete_task(
     session: AsyncSession = Depends(db_helper.session_dependency),
     task: Task = Depends(get_task_by_id),
@@ -78,118 +283,293 @@ async def delete_task(
     await crud.delete_task(session=session, task=task)
 
 
-@router.post("/rooms")
+@router.post("/rooms", response_model=GetRoom)
+@query_budget(4)
 async def create_room(
     room: CreateRoom,
     session: AsyncSession = Depends(db_helper.session_dependency),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
+    members: RoomMembersCache = Depends(get_room_members_cache),
 ):
-    return await create_room_and_creator(session, room, user)
+    return await create_room_and_creator(session, room, user, members)
 
 
-@router.get("/rooms/{room_id}")
+@router.post("/rooms/{room_id}/batch", response_model=BatchResult, status_code=201)
+@query_budget(crud.BATCH_INSERT_PAGES)
+async def create_tasks_batch_in_room(
+    batch: BatchCreateTasks,
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    context: RoomContext = Depends(get_room_context),
+):
+    return await crud.create_tasks_batch_in_room(
+        session=session,
+        user=context.user,
+        items=batch.items,
+        room_id=context.room_id,
+        role=context.role,
+    )
+
+
+@router.patch("/rooms/{room_id}/batch", response_model=BatchResult)
+@query_budget(2)
+async def patch_tasks_batch_in_room(
+    batch: BatchUpdateTasks,
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    context: RoomContext = Depends(get_room_context),
+):
+    return await crud.patch_tasks_batch_in_room(
+        session=session,
+        user=context.user,
+        items=batch.items,
+        room_id=context.room_id,
+        role=context.role,
+    )
+
+
+@router.post("/rooms/{room_id}/batch/completed", response_model=BatchResult)
+@query_budget(2)
+async def complete_tasks_batch_in_room(
+    batch: BatchTaskIds,
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    context: RoomContext = Depends(get_room_context),
+):
+    return await crud.complete_tasks_batch_in_room(
+        session=session, user=context.user, ids=batch.ids, room_id=context.room_id
+    )
+
+
+@router.post("/rooms/{room_id}/batch/delete", response_model=BatchResult)
+@query_budget(1)
+async def delete_tasks_batch_in_room(
+    batch: BatchTaskIds,
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    context: RoomContext = Depends(get_room_context),
+):
+    return await crud.delete_tasks_batch_in_room(
+        session=session,
+        user=context.user,
+        ids=batch.ids,
+        room_id=context.room_id,
+        role=context.role,
+    )
+
+
+@router.get("/rooms/{room_id}/export")
+@query_budget(0)
+async def export_tasks_from_room(
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+    context: RoomContext = Depends(get_read_room_context),
+    reads: ReadSessions = Depends(db_helper.read_sessions_dependency),
+):
+    scope = crud.task_scope(context.user, OwnerType.ROOM, context.room_id)
+    return StreamingResponse(
+        export.export_tasks(scope, fmt, reads.factory()),
+        media_type=export.media_types[fmt],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="room_{context.room_id}_tasks.{fmt}"'
+            )
+        },
+    )
+
+
+@router.get("/rooms/{room_id}/search", response_model=TaskSearchPage)
+@query_budget(1)
+async def search_tasks_in_room(
+    q: str = Query(min_length=1, max_length=256),
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    reads: ReadSessions = Depends(db_helper.read_sessions_dependency),
+    context: RoomContext = Depends(get_read_room_context),
+    cache: TaskListCache = Depends(get_task_list_cache),
+    if_none_match: str | None = Header(None),
+):
+    return await _read_through(
+        cache,
+        reads,
+        OwnerType.ROOM,
+        context.room_id,
+        ("search", q, cursor, limit),
+        if_none_match,
+        lambda session: _render_search_page(
+            crud.search_tasks(
+                session=session,
+                user=context.user,
+                q=q,
+                cursor=cursor,
+                limit=limit,
+                owner_type=OwnerType.ROOM,
+                room_id=context.room_id,
+            )
+        ),
+    )
+
+
+@router.get("/rooms/{room_id}/changes", response_model=TaskChanges)
+@query_budget(3)
+async def get_changes_from_room(
+    since: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    context: RoomContext = Depends(get_room_context),
+):
+    changes = await crud.get_changes(
+        session=session,
+        user=context.user,
+        since=since,
+        limit=limit,
+        owner_type=OwnerType.ROOM,
+        room_id=context.room_id,
+    )
+    return render_task_changes(changes)
+
+
+@router.websocket("/rooms/{room_id}/ws")
+@query_budget(3)
+async def room_events_socket(
+    websocket: WebSocket,
+    room_id: int,
+    events: RoomEventBus = Depends(get_room_events),
+):
+    context, payload = await realtime.authenticate_room_socket(
+        realtime.socket_token(websocket), room_id
+    )
+    await realtime.stream_room_events(websocket, events, context, payload)
+
+
+@router.get("/rooms/{room_id}", response_model=TaskPage)
+@query_budget(1)
 async def get_all_tasks_from_room_with_id(
     room_id: int,
-    session: AsyncSession = Depends(db_helper.session_dependency),
-    user: User = Depends(get_current_user),
-    room_member=Depends(get_user_as_member_of_room),
+    reads: ReadSessions = Depends(db_helper.read_sessions_dependency),
+    context: RoomContext = Depends(get_read_room_context),
     order_by: str = "created_at",
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: tuple[str, ...] | None = Depends(parse_fields),
+    cache: TaskListCache = Depends(get_task_list_cache),
+    if_none_match: str | None = Header(None),
 ):
-    if not room_member:
-        raise HTTPException(status_code=403, detail="Not a room member")
-    return await get_all_tasks_from_room(session, user, room_id, order_by)
+    return await _read_through(
+        cache,
+        reads,
+        OwnerType.ROOM,
+        room_id,
+        ("list", order_by, cursor, limit, _fields_part(fields)),
+        if_none_match,
+        lambda session: _render_page(
+            get_all_tasks_from_room(
+                session,
+                context.user,
+                room_id,
+                order_by,
+                cursor=cursor,
+                limit=limit,
+                fields=fields,
+            ),
+            fields,
+        ),
+    )
 
 
 @router.post("/rooms/{room_id}", response_model=GetTask)
+@query_budget(2)
 async def create_new_task_in_room(
     task_in: CreateTask,
     session: AsyncSession = Depends(db_helper.session_dependency),
-    user=Depends(get_current_user),
-    room=Depends(get_current_room),
-    room_member=Depends(get_user_as_member_of_room),
+    context: RoomContext = Depends(get_room_context),
 ):
-    if not room_member:
-        raise HTTPException(status_code=403, detail="Not a room member")
     task = await create_task_in_room(
-        session=session, user=user, room=room, task_in=task_in, room_member=room_member
+        session=session,
+        user=context.user,
+        room_id=context.room_id,
+        task_in=task_in,
+        role=context.role,
     )
     return GetTask.model_validate(task)
 
 
-@router.patch("/rooms/{room_id}/{task_id}")
+@router.patch("/rooms/{room_id}/{task_id}", response_model=GetTask)
+@query_budget(1)
 async def update_tasks_in_room(
     task_id: int,
     task_in: UpdateTask,
     session: AsyncSession = Depends(db_helper.session_dependency),
-    user=Depends(get_current_user),
-    room=Depends(get_current_room),
-    room_member=Depends(get_user_as_member_of_room),
+    context: RoomContext = Depends(get_room_context),
 ):
     return await patch_task_in_room(
         session=session,
-        user=user,
+        user=context.user,
         task_in=task_in,
-        room=room,
-        room_member=room_member,
+        room_id=context.room_id,
+        role=context.role,
         task_id=task_id,
     )
 
 
-@router.patch("/rooms/{room_id}/{task_id}/completed")
+@router.patch("/rooms/{room_id}/{task_id}/completed", response_model=GetTask)
+@query_budget(2)
 async def complete_task_in_room(
     task_id: int,
     session: AsyncSession = Depends(db_helper.session_dependency),
-    user=Depends(get_current_user),
-    room=Depends(get_current_room),
+    context: RoomContext = Depends(get_room_context),
 ):
     return await only_complete_task_in_room(
-        session=session, user=user, room=room, task_id=task_id
+        session=session, user=context.user, room_id=context.room_id, task_id=task_id
     )
 
 
-@router.patch("/rooms/{room_id}/{task_id}/accept")
+@router.patch("/rooms/{room_id}/{task_id}/accept", response_model=GetTask)
+@query_budget(2)
 async def accept_task_in_room(
     task_id: int,
     session: AsyncSession = Depends(db_helper.session_dependency),
-    user=Depends(get_current_user),
-    room=Depends(get_current_room),
+    context: RoomContext = Depends(get_room_context),
 ):
-    return await accept_task(session, user, room, task_id)
+    return await accept_task(session, context.user, context.room_id, task_id)
 
 
-@router.delete("/rooms/{room_id}/{task_id: int}")
+@router.delete("/rooms/{room_id}/{task_id:int}")
+@query_budget(2)
 async def delete_tasks_in_room(
     task_id: int,
     session: AsyncSession = Depends(db_helper.session_dependency),
-    user=Depends(get_current_user),
-    room=Depends(get_current_room),
-    room_member=Depends(get_user_as_member_of_room),
+    context: RoomContext = Depends(get_room_context),
 ):
     await delete_task_in_room(
-        session=session, room_member=room_member, room=room, user=user, task_id=task_id
+        session=session,
+        role=context.role,
+        room_id=context.room_id,
+        user=context.user,
+        task_id=task_id,
     )
 
 
 @router.post("/rooms/{room_id}/create_invite_link")
+@query_budget(0)
 async def create_invite_link(
     room_id: int,
-    user=Depends(get_current_user),
-    room=Depends(get_current_room),
-    room_member=Depends(get_user_as_member_of_room),
+    max_uses: int | None = Query(None, ge=1),
+    context: RoomContext = Depends(get_room_context),
     invites_codes_cache=Depends(get_invites_codes_cache),
 ):
     return await crud.create_invite_link(
-        room_id=room_id, room_member=room_member, cache=invites_codes_cache
+        room_id=room_id,
+        role=context.role,
+        cache=invites_codes_cache,
+        max_uses=max_uses,
     )
 
 
 @router.post("/rooms/{room_id}/{invite_code}", status_code=204)
+@query_budget(2)
 async def join_to_room(
     room_id: int,
     invite_code: str,
     user=Depends(get_current_user),
     invites_codes_cache=Depends(get_invites_codes_cache),
     session=Depends(db_helper.session_dependency),
+    members=Depends(get_room_members_cache),
 ):
     await crud.join_to_room(
         room_id=room_id,
@@ -197,15 +577,17 @@ async def join_to_room(
         user=user,
         cache=invites_codes_cache,
         session=session,
+        members=members,
     )
 
 
 @router.delete("/rooms/{room_id}/delete_invite_link", status_code=HTTP_204_NO_CONTENT)
+@query_budget(0)
 async def delete_invite_link(
     room_id: int,
-    room_member=Depends(get_user_as_member_of_room),
+    context: RoomContext = Depends(get_room_context),
     invites_codes_cache=Depends(get_invites_codes_cache),
 ):
     await crud.delete_invite_link(
-        room_id=room_id, cache=invites_codes_cache, room_member=room_member
+        room_id=room_id, cache=invites_codes_cache, role=context.role
     )
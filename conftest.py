@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+# До импорта настроек: ленивые связи бросают исключение, бюджеты строгие
+os.environ.setdefault("TESTING", "true")
+# Тесты с базой ходят только в отдельную тестовую БД
+if os.getenv("TEST_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://localhost/test")
+os.environ.setdefault("REDIS_URL", "redis://localhost")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+
+@pytest.fixture
+def query_budget():
+    # Считаем во всём процессе: TestClient гоняет приложение в другом потоке
+    from core.query_budget import assert_query_budget
+
+    return assert_query_budget
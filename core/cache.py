@@ -0,0 +1,92 @@
+import hashlib
+import time
+from collections import OrderedDict, deque
+from typing import Any, Hashable
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self._ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class SlidingWindow:
+    # Запасной лимит, пока Redis недоступен: считается на воркер
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._data: OrderedDict[Hashable, deque[float]] = OrderedDict()
+
+    def _window(self, key: Hashable, now: float, window: float) -> deque[float]:
+        hits = self._data.get(key)
+        if hits is None:
+            hits = self._data[key] = deque()
+        self._data.move_to_end(key)
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+        return hits
+
+    def hit(self, rules: list[tuple[Hashable, int, float]]) -> float:
+        now = time.monotonic()
+        windows = [
+            (self._window(key, now, window), limit, window)
+            for key, limit, window in rules
+        ]
+        retry_after = 0.0
+        for hits, limit, window in windows:
+            if len(hits) >= limit:
+                retry_after = max(retry_after, hits[0] + window - now)
+        if retry_after > 0:
+            return retry_after
+        for hits, _, _ in windows:
+            hits.append(now)
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+        return 0.0
+
+
+class BloomFilter:
+    def __init__(self, size: int, hashes: int):
+        self._size = size
+        self._hashes = hashes
+        self._bits = bytearray((size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self._hashes):
+            yield (first + i * second) % self._size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
@@ -7,8 +7,66 @@ load_dotenv(".env")
 
 
 class Settings(BaseSettings):
+    testing: bool = False
+
     db_url: str = os.getenv("DATABASE_URL")
-    db_echo: bool = True
+    db_echo: bool = False
+    # workers * (pool_size + max_overflow) должно укладываться в max_connections
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # 0 - без кэша подготовленных запросов, нужно за pgbouncer в режиме transaction
+    db_prepared_statement_cache_size: int = 100
+    db_statement_timeout: int = 30_000  # мс, 0 - без ограничения
+    # JSON-список, например DB_REPLICA_URLS='["postgresql+asyncpg://..."]'
+    db_replica_urls: list[str] = []
+    db_replica_max_lag: float = 5
+    db_replica_lag_check_interval: float = 1
+    db_slow_query_ms: float | None = None
+
+    # На каждый воркер uvicorn; вместе с воркерами - в пределах числа ядер
+    hash_workers: int = 2
+    hash_max_pending: int = 256
+
+    principal_ttl: int = 300
+    principal_local_ttl: float = 5
+    principal_local_size: int = 10_000
+
+    code_max_attempts: int = 5
+
+    # Лимиты вида "запросов/секунд". Глобальный на IP выключен: лишний поход
+    # в Redis на каждый запрос, а клиенты за одним NAT делят окно
+    rate_limit_enabled: bool = True
+    rate_limits: dict[str, dict[str, str]] = {
+        "login": {"ip": "20/60", "email": "5/60"},
+        "register": {"ip": "5/600"},
+        "verify": {"ip": "20/60", "email": "10/600"},
+        "password_reset": {"ip": "5/600", "email": "3/600"},
+    }
+    rate_limit_global: str | None = None
+    rate_limit_redis_timeout: float = 0.2
+    rate_limit_local_size: int = 100_000
+
+    refresh_token_minutes: int = 60 * 24 * 7
+    # 128 КБ: на 100 тысяч отозванных семейств ~1% ложных совпадений
+    refresh_bloom_size: int = 1 << 20
+    refresh_bloom_hashes: int = 7
+    refresh_bloom_rebuild_interval: float = 30
+    refresh_bloom_full_rebuild_interval: float = 3600
+
+    room_members_ttl: int = 3600
+    room_members_local_ttl: float = 5
+    room_members_local_size: int = 10_000
+
+    export_fetch_size: int = 1000
+
+    task_list_cache_ttl: int = 60
+
+    room_events_queue_size: int = 100
+
+    metrics_token: str | None = None
 
 
 setting = Settings()
@@ -0,0 +1,69 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.context import CryptContext
+
+from core.config import setting
+
+hashed_content = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _hash(password: str) -> str:
+    return hashed_content.hash(password)
+
+
+def _verify(password: str, password_hash: str) -> bool:
+    return hashed_content.verify(password, password_hash)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int):
+        self._workers = workers
+        self._max_pending = max_pending
+        self._pending = 0
+        self._pool: ProcessPoolExecutor | None = None
+
+    def start(self):
+        if self._pool is not None:
+            return
+        self._pool = ProcessPoolExecutor(max_workers=self._workers)
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, func, *args):
+        if self._pending >= self._max_pending:
+            raise HasherBusy()
+        self.start()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, func, *args)
+        except BrokenProcessPool:
+            self._pool = None
+            raise
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(_verify, password, password_hash)
+
+
+password_hasher = PasswordHasher(
+    workers=setting.hash_workers,
+    max_pending=setting.hash_max_pending,
+)
@@ -0,0 +1,98 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger("uvicorn.error")
+
+SLOW_QUERY_PARAMS_LIMIT = 1000
+
+
+class RequestStats:
+    __slots__ = ("db_count", "db_seconds", "redis_count", "redis_seconds")
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.redis_count = 0
+        self.redis_seconds = 0.0
+
+
+# SQLAlchemy выполняет запросы в greenlet с тем же контекстом
+request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+# Глобальные счётчики для фикстуры: TestClient выполняет приложение
+# в другом потоке, контекст туда не попадает
+statement_counters: ContextVar[tuple] = ContextVar("statement_counters", default=())
+global_statement_counters: list = []
+
+
+def record_redis(seconds: float):
+    stats = request_stats.get()
+    if stats is not None:
+        stats.redis_count += 1
+        stats.redis_seconds += seconds
+
+
+def instrument_engine(engine: AsyncEngine, slow_query_ms: float | None = None):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        for counter in (*statement_counters.get(), *global_statement_counters):
+            counter.add(statement)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.db_count += 1
+            stats.db_seconds += elapsed
+        if slow_query_ms is not None and elapsed * 1000 >= slow_query_ms:
+            logger.warning(
+                "Slow query %.1f ms: %s params=%.*s",
+                elapsed * 1000,
+                statement,
+                SLOW_QUERY_PARAMS_LIMIT,
+                repr(parameters),
+            )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        started = (
+            context.connection.info.get("query_started") if context.connection else None
+        )
+        if started:
+            started.pop()
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            record_redis(time.perf_counter() - started)
+
+
+class InstrumentedRedis(Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            record_redis(time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None):
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
@@ -0,0 +1,136 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = defaultdict(float)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] += amount
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...],
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _labels(self.labels, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            le = _labels(self.labels, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total}")
+            lines.append(
+                f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+            )
+        return lines
+
+
+def render_samples(
+    name: str,
+    documentation: str,
+    samples: list[tuple[dict, float]],
+    kind: str = "gauge",
+) -> list[str]:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        names, values = tuple(labels), tuple(labels.values())
+        lines.append(f"{name}{_labels(names, values)} {value}")
+    return lines
+
+
+ROUTE_LABELS = ("method", "route")
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency", ROUTE_LABELS
+)
+requests_total = Counter(
+    "http_requests_total", "Requests by status", ROUTE_LABELS + ("status",)
+)
+db_queries = Histogram(
+    "http_request_db_queries",
+    "SQL statements per request",
+    ROUTE_LABELS,
+    buckets=QUERY_COUNT_BUCKETS,
+)
+db_duration = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request", ROUTE_LABELS
+)
+redis_duration = Histogram(
+    "http_request_redis_seconds", "Time spent in Redis per request", ROUTE_LABELS
+)
+route_metrics = (
+    request_duration,
+    requests_total,
+    db_queries,
+    db_duration,
+    redis_duration,
+)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float, stats):
+    request_duration.observe(seconds, method, route)
+    requests_total.inc(method, route, status)
+    db_queries.observe(stats.db_count, method, route)
+    db_duration.observe(stats.db_seconds, method, route)
+    redis_duration.observe(stats.redis_seconds, method, route)
+
+
+def render_metrics(extra: list[str] = ()) -> str:
+    lines = []
+    for metric in route_metrics:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
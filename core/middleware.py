@@ -0,0 +1,118 @@
+import time
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.instrumentation import RequestStats, request_stats
+from core.metrics import observe_request
+from core.models.db_helper import LAST_WRITE_COOKIE
+from core.models.redis_helper import get_rate_limiter
+from core.rate_limit import client_ip, parse_rate, retry_after_header
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class ReadYourWritesMiddleware:
+    def __init__(self, app: ASGIApp, max_lag: float):
+        self.app = app
+        self.max_age = max(int(max_lag) + 1, 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = (
+                    f"{LAST_WRITE_COOKIE}={time.time():.3f}; Max-Age={self.max_age}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"set-cookie", cookie.encode()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def server_timing(stats: RequestStats, elapsed: float) -> str:
+    return (
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_count} queries", '
+        f'redis;dur={stats.redis_seconds * 1000:.1f};desc="{stats.redis_count} commands", '
+        f"app;dur={elapsed * 1000:.1f}"
+    )
+
+
+class TimingMiddleware:
+    # Чистый ASGI: BaseHTTPMiddleware буферизует ответ и ломает стриминг экспорта
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = server_timing(stats, time.perf_counter() - started)
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", timing.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_stats.reset(token)
+            # Шаблон пути, а не сам путь: иначе у метрик неограниченное число меток
+            route = scope.get("route")
+            observe_request(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status,
+                time.perf_counter() - started,
+                stats,
+            )
+
+
+class RateLimitMiddleware:
+    EXEMPT_PATHS = ("/metrics",)
+
+    def __init__(self, app: ASGIApp, rate: str):
+        self.app = app
+        self.limit, self.window = parse_rate(rate)
+
+    def _exempt(self, scope: Scope) -> bool:
+        if scope["type"] != "http" or scope["path"] in self.EXEMPT_PATHS:
+            return True
+        # Ревалидация по ETag отвечает 304 без базы
+        return scope["method"] in ("GET", "HEAD") and any(
+            name == b"if-none-match" for name, _ in scope["headers"]
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if self._exempt(scope):
+            await self.app(scope, receive, send)
+            return
+        retry_after = await get_rate_limiter().hit(
+            [(f"global:ip:{client_ip(scope)}", self.limit, self.window)]
+        )
+        if retry_after <= 0:
+            await self.app(scope, receive, send)
+            return
+        response = JSONResponse(
+            {"detail": "Too many requests"},
+            status_code=429,
+            headers={"Retry-After": retry_after_header(retry_after)},
+        )
+        await response(scope, receive, send)
@@ -6,6 +6,7 @@ __all__ = (
     "Room",
     "Room_Member",
     "UserRelationship",
+    "TaskTombstone",
 )
 from .base import Base
 from .mixins import UserRelationship
@@ -13,4 +14,5 @@ from .tasks import Task
 from .users import User
 from .rooms import Room
 from .room_member import Room_Member
+from .task_tombstones import TaskTombstone
 from .db_helper import db_helper
@@ -1,5 +1,9 @@
 from sqlalchemy.orm import DeclarativeBase, declared_attr, Mapped, mapped_column
 
+from core.config import setting
+
+LAZY_STRATEGY = "raise_on_sql" if setting.testing else "select"
+
 
 class Base(DeclarativeBase):
     __abstract__ = True
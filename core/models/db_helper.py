@@ -1,27 +1,174 @@
 import asyncio
+import itertools
+import logging
+import time
 from asyncio import current_task
-from typing import AsyncGenerator
+from dataclasses import dataclass
+from typing import AsyncGenerator, Sequence
 
-from sqlalchemy.exc import OperationalError
+from fastapi import Cookie
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
     AsyncSession,
     async_scoped_session,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from core.config import setting
+from core.instrumentation import instrument_engine
+
+logger = logging.getLogger("uvicorn.error")
+
+LAST_WRITE_COOKIE = "last_write"
+
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """)
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, seconds: float):
+        self.checkouts += 1
+        self.wait_seconds += seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds,
+            "wait_seconds_max": self.max_wait_seconds,
+        }
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        self.metrics.record_wait(time.perf_counter() - started)
+        return record
+
+    def recreate(self):
+        # dispose() пересоздаёт пул, счётчики переносим в новый
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def _make_session_factory(engine) -> async_sessionmaker:
+    return async_sessionmaker(
+        bind=engine,
+        autoflush=False,
+        autocommit=False,
+        expire_on_commit=False,
+    )
+
+
+def parse_last_write(value: str | None) -> float | None:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return time.time()
+
+
+@dataclass(slots=True)
+class Replica:
+    name: str
+    engine: object
+    session_factory: async_sessionmaker
+    lag: float | None = None
+
+
+class ReadSessions:
+    def __init__(self, helper: "DataBaseHelper", last_write: float | None):
+        self._helper = helper
+        self._last_write = last_write
+        self._sessions: list[AsyncSession] = []
+
+    def factory(self, fresh_since: float | None = None) -> async_sessionmaker:
+        moments = [t for t in (self._last_write, fresh_since) if t is not None]
+        return self._helper.read_session_factory(max(moments, default=None))
+
+    def session(self, fresh_since: float | None = None) -> AsyncSession:
+        session = self.factory(fresh_since)()
+        self._sessions.append(session)
+        return session
+
+    async def close(self):
+        for session in self._sessions:
+            await session.close()
 
 
 class DataBaseHelper:
-    def __init__(self, url, echo):
-        self.engine = create_async_engine(url=url, echo=echo)
-        self.session_factory = async_sessionmaker(
-            bind=self.engine,
-            autoflush=False,
-            autocommit=False,
-            expire_on_commit=False,
+    def __init__(
+        self,
+        url,
+        echo,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: float = 30,
+        pool_recycle: int = -1,
+        pool_pre_ping: bool = False,
+        prepared_statement_cache_size: int = 100,
+        statement_timeout: int = 0,
+        replica_urls: Sequence[str] = (),
+        replica_max_lag: float = 5,
+        slow_query_ms: float | None = None,
+    ):
+        engine_options = dict(
+            echo=echo,
+            poolclass=TimedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=pool_pre_ping,
+            connect_args={
+                "prepared_statement_cache_size": prepared_statement_cache_size,
+                "server_settings": {"statement_timeout": str(statement_timeout)},
+            },
         )
+        self.engine = create_async_engine(url=url, **engine_options)
+        instrument_engine(self.engine, slow_query_ms)
+        self.session_factory = _make_session_factory(self.engine)
+        self.replicas = []
+        for number, replica_url in enumerate(replica_urls):
+            engine = create_async_engine(url=replica_url, **engine_options)
+            instrument_engine(engine, slow_query_ms)
+            self.replicas.append(
+                Replica(
+                    name=f"replica{number}",
+                    engine=engine,
+                    session_factory=_make_session_factory(engine),
+                )
+            )
+        self.replica_max_lag = replica_max_lag
+        self._lag_margin = 0.0
+        self._round_robin = itertools.count()
+        self._monitor: asyncio.Task | None = None
 
     def get_scoped_session(self):
         session = async_scoped_session(
@@ -35,5 +182,90 @@ class DataBaseHelper:
             yield session
             await session.close()
 
+    def _pick_replica(self, max_lag: float) -> Replica | None:
+        candidates = [
+            replica
+            for replica in self.replicas
+            if replica.lag is not None and replica.lag + self._lag_margin <= max_lag
+        ]
+        if not candidates:
+            return None
+        return candidates[next(self._round_robin) % len(candidates)]
+
+    def read_session_factory(self, fresh_since: float | None = None):
+        max_lag = self.replica_max_lag
+        if fresh_since is not None:
+            max_lag = min(max_lag, time.time() - fresh_since)
+        replica = self._pick_replica(max_lag)
+        return replica.session_factory if replica else self.session_factory
+
+    async def read_sessions_dependency(
+        self, last_write: str | None = Cookie(default=None, alias=LAST_WRITE_COOKIE)
+    ) -> AsyncGenerator[ReadSessions, None]:
+        reads = ReadSessions(self, parse_last_write(last_write))
+        try:
+            yield reads
+        finally:
+            await reads.close()
 
-db_helper = DataBaseHelper(url=setting.db_url, echo=True)
+    async def check_replicas(self, timeout: float):
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    lag = await asyncio.wait_for(
+                        conn.scalar(REPLICA_LAG_QUERY), timeout
+                    )
+                replica.lag = float(lag) if lag is not None else None
+            except Exception as error:
+                if replica.lag is not None:
+                    logger.warning("Replica %s is unavailable: %r", replica.name, error)
+                replica.lag = None
+
+    async def _monitor_replicas(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_replicas(timeout=interval)
+
+    async def start(self, lag_check_interval: float):
+        if not self.replicas or self._monitor is not None:
+            return
+        self._lag_margin = lag_check_interval
+        await self.check_replicas(timeout=lag_check_interval)
+        self._monitor = asyncio.create_task(self._monitor_replicas(lag_check_interval))
+
+    async def close(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+        await self.engine.dispose()
+
+    def replica_status(self) -> list[dict]:
+        return [{"name": replica.name, "lag": replica.lag} for replica in self.replicas]
+
+    def pool_metrics(self, engine=None) -> dict:
+        pool = (engine or self.engine).pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            **pool.metrics.snapshot(),
+        }
+
+
+db_helper = DataBaseHelper(
+    url=setting.db_url,
+    echo=setting.db_echo,
+    pool_size=setting.db_pool_size,
+    max_overflow=setting.db_max_overflow,
+    pool_timeout=setting.db_pool_timeout,
+    pool_recycle=setting.db_pool_recycle,
+    pool_pre_ping=setting.db_pool_pre_ping,
+    prepared_statement_cache_size=setting.db_prepared_statement_cache_size,
+    statement_timeout=setting.db_statement_timeout,
+    replica_urls=setting.db_replica_urls,
+    replica_max_lag=setting.db_replica_max_lag,
+    slow_query_ms=setting.db_slow_query_ms,
+)
@@ -1,6 +1,7 @@
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import declared_attr, Mapped, mapped_column, relationship
 
+from core.models.base import LAZY_STRATEGY
 from core.models.users import User
 
 
@@ -16,4 +17,4 @@ class UserRelationship:
 
     @declared_attr
     def user(cls) -> Mapped["User"]:
-        return relationship(back_populates=cls._user_back_populates)
+        return relationship(back_populates=cls._user_back_populates, lazy=LAZY_STRATEGY)
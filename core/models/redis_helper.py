@@ -1,24 +1,44 @@
+import asyncio
+import json
+import logging
 import os
+import time
+from contextlib import suppress
+from enum import IntEnum
+from uuid import uuid4
 
 from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from redis.commands.core import AsyncScript
 
-from core.security import create_password_hash
+from core.cache import BloomFilter, SlidingWindow, TTLCache
+from core.config import setting
+from core.hasher import password_hasher
+from core.instrumentation import InstrumentedRedis
+from core.models.redis_scripts import SCRIPTS
+
+logger = logging.getLogger("uvicorn.error")
 
 
 class RedisHelper:
     def __init__(self, url: str):
         self._url = url
         self._redis: Redis | None = None
+        self._scripts: dict[str, AsyncScript] = {}
 
     async def connect(self):
         if self._redis is not None:
             return
-        self._redis = Redis.from_url(url=self._url, decode_responses=True)
+        self._redis = InstrumentedRedis.from_url(url=self._url, decode_responses=True)
+        for name, source in SCRIPTS.items():
+            self._scripts[name] = self._redis.register_script(source)
+            await self._redis.script_load(source)
 
     async def close(self):
         if self._redis:
-            await self._redis.close()
+            await self._redis.aclose()
             self._redis = None
+            self._scripts = {}
 
     @property
     def conn(self) -> Redis:
@@ -26,47 +46,604 @@ class RedisHelper:
             raise RuntimeError("Redis is not connected")
         return self._redis
 
+    @property
+    def scripts(self) -> dict[str, AsyncScript]:
+        if not self._scripts:
+            raise RuntimeError("Redis is not connected")
+        return self._scripts
+
 
 redis_helper = RedisHelper(os.getenv("REDIS_URL"))
 
 
+class CodeStatus(IntEnum):
+    OK = 1
+    MISSING = 0
+    INVALID = -1
+    EXHAUSTED = -2
+
+
 class VerificationCodesCache:
-    KEY_PREFIX = "confirm_code"
+    # v2: хэш {code, attempts}; строки старого формата не читаются и истекают сами
+    KEY_PREFIX = "confirm_code:v2"
 
-    def __init__(self, redis: Redis):
+    def __init__(self, redis: Redis, scripts: dict[str, AsyncScript]):
         self._redis = redis
+        self._scripts = scripts
 
     def _key(self, email: str):
         return f"{self.KEY_PREFIX}:{email}"
 
     async def get(self, email: str):
-        return await self._redis.get(self._key(email))
+        return await self._redis.hget(self._key(email), "code")
 
     async def set(self, email: str, value: str, ttl: int = 300):
-        await self._redis.set(self._key(email), value, ttl)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(email))
+            pipe.hset(self._key(email), "code", value)
+            pipe.expire(self._key(email), ttl)
+            await pipe.execute()
 
     async def delete(self, email: str):
         await self._redis.delete(self._key(email))
 
+    async def consume(self, email: str, value: str) -> CodeStatus:
+        return CodeStatus(
+            await self._scripts["consume_code"](
+                keys=[self._key(email)], args=[value, setting.code_max_attempts]
+            )
+        )
+
 
 class ResetCodesCache(VerificationCodesCache):
-    KEY_PREFIX = "reset_code"
+    KEY_PREFIX = "reset_code:v2"
 
     async def set(self, email: str, value: str, ttl: int = 300):
-        hashed_value = create_password_hash(value)
-        await self._redis.set(self._key(email), hashed_value, ttl)
+        hashed_value = await password_hasher.hash(value)
+        await super().set(email, hashed_value, ttl)
+
+    async def consume_if_equal(self, email: str, stored: str) -> bool:
+        # Хэш кода сверяет вызывающий, скрипт гасит именно этот код и ровно один раз
+        return bool(
+            await self._scripts["consume_if_equal"](
+                keys=[self._key(email)], args=[stored]
+            )
+        )
+
+    async def register_failure(self, email: str) -> CodeStatus:
+        return CodeStatus(
+            await self._scripts["register_failure"](
+                keys=[self._key(email)], args=[setting.code_max_attempts]
+            )
+        )
 
 
 class InvitesCodesCaches(VerificationCodesCache):
-    KEY_PREFIX = "invite_code"
+    KEY_PREFIX = "invite_code:v2"
+
+    async def set(
+        self,
+        room_id: int,
+        value: str,
+        ttl: int = 60 * 60 * 24,
+        max_uses: int | None = None,
+    ):
+        await self._scripts["issue_invite"](
+            keys=[self._key(str(room_id))], args=[value, ttl, max_uses or 0]
+        )
+
+    async def redeem(self, room_id: int, value: str) -> bool:
+        return bool(
+            await self._scripts["redeem_invite"](
+                keys=[self._key(str(room_id))], args=[value]
+            )
+        )
+
+
+class PrincipalCache:
+    KEY_PREFIX = "principal"
+    INVALIDATED_CHANNEL = "principal_invalidated"
+
+    def __init__(self, redis: Redis, ttl: int = 300):
+        self._redis = redis
+        self._ttl = ttl
+        # Другие воркеры чистят локальную копию по pub/sub; короткий TTL страхует
+        # от сообщений, потерянных при переподключении
+        self._local = TTLCache(
+            maxsize=setting.principal_local_size,
+            ttl=setting.principal_local_ttl,
+        )
+        self._pubsub = redis.pubsub()
+        self._listener: asyncio.Task | None = None
+        self._closing = False
+
+    async def start(self):
+        if self._listener is not None:
+            return
+        await self._pubsub.subscribe(self.INVALIDATED_CHANNEL)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        self._closing = True
+        if self._listener is not None:
+            self._listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+        await self._pubsub.aclose()
+
+    def _key(self, user_id: int):
+        return f"{self.KEY_PREFIX}:{user_id}"
+
+    async def get(self, user_id: int) -> dict | None:
+        principal = self._local.get(user_id)
+        if principal is not None:
+            return principal
+        raw = await self._redis.get(self._key(user_id))
+        if raw is None:
+            return None
+        principal = json.loads(raw)
+        self._local.set(user_id, principal)
+        return principal
+
+    async def set(self, user_id: int, principal: dict):
+        self._local.set(user_id, principal)
+        await self._redis.set(self._key(user_id), json.dumps(principal), self._ttl)
+
+    async def invalidate(self, user_id: int):
+        self._local.delete(user_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(user_id))
+            pipe.publish(self.INVALIDATED_CHANNEL, user_id)
+            await pipe.execute()
+
+    async def _listen(self):
+        while not self._closing:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Principal invalidations subscriber failed, retrying")
+                await asyncio.sleep(1)
+                continue
+            if message is not None and message["type"] == "message":
+                self._local.delete(int(message["data"]))
+
+
+MEMBERS_CHANGED = "members_changed"
+
+
+class RoomMembersCache:
+    KEY_PREFIX = "room_members"
+    VERSION_PREFIX = "room_members_version"
+    # Метка полностью загруженного хэша: без поля user_id значит "не участник"
+    LOADED = "__loaded__"
+
+    def __init__(
+        self,
+        redis: Redis,
+        scripts: dict[str, AsyncScript],
+        ttl: int = 3600,
+        stale_window: float = 0,
+    ):
+        self._redis = redis
+        self._scripts = scripts
+        self._ttl = ttl
+        # После invalidate реплика ещё может отдавать старый состав
+        self._stale_window = stale_window
+        # Только найденные роли: отрицательный ответ задержал бы нового участника
+        self._local = TTLCache(
+            maxsize=setting.room_members_local_size,
+            ttl=setting.room_members_local_ttl,
+        )
+
+    def _key(self, room_id: int):
+        return f"{self.KEY_PREFIX}:{room_id}"
+
+    def _version_key(self, room_id: int):
+        return f"{self.VERSION_PREFIX}:{room_id}"
+
+    async def get(self, room_id: int, user_id: int) -> tuple[bool, str | None]:
+        role = self._local.get((room_id, user_id))
+        if role is not None:
+            return True, role
+        loaded, role = await self._redis.hmget(
+            self._key(room_id), self.LOADED, str(user_id)
+        )
+        if role is None:
+            return loaded is not None, None
+        self._local.set((room_id, user_id), role)
+        return True, role
+
+    async def version(self, room_id: int) -> str:
+        # Читать до запроса в базу: load() отбросит состав, устаревший за время запроса
+        return await self._redis.hget(self._version_key(room_id), "gen") or ""
+
+    async def load(self, room_id: int, roles: dict[int, str], version: str = ""):
+        args = [version, self._ttl, self._stale_window]
+        for user_id, role in roles.items():
+            args += [str(user_id), role]
+        args += [self.LOADED, "1"]
+        return bool(
+            await self._scripts["load_members"](
+                keys=[self._key(room_id), self._version_key(room_id)], args=args
+            )
+        )
+
+    async def add(self, room_id: int, user_id: int, role: str):
+        self._local.set((room_id, user_id), role)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(room_id), str(user_id), role)
+            pipe.expire(self._key(room_id), self._ttl)
+            await pipe.execute()
+
+    async def invalidate(self, room_id: int, user_id: int | None = None):
+        if user_id is not None:
+            self._local.delete((room_id, user_id))
+        await self._scripts["invalidate_members"](
+            keys=[self._key(room_id), self._version_key(room_id)], args=[self._ttl]
+        )
+        await self._redis.publish(
+            f"{RoomEventBus.CHANNEL_PREFIX}:{room_id}",
+            json.dumps({"type": MEMBERS_CHANGED, "user_id": user_id}),
+        )
+
+
+class RateLimiter:
+    KEY_PREFIX = "rate"
+
+    def __init__(self, script: AsyncScript, timeout: float, local_size: int):
+        self._script = script
+        self._timeout = timeout
+        self._local = SlidingWindow(maxsize=local_size)
+        self._degraded = False
+
+    def _key(self, name: str):
+        return f"{self.KEY_PREFIX}:{name}"
+
+    async def hit(self, rules: list[tuple[str, int, float]]) -> float:
+        if not rules:
+            return 0.0
+        args = [uuid4().hex]
+        for _, limit, window in rules:
+            args += [limit, int(window * 1000)]
+        try:
+            retry_ms = await asyncio.wait_for(
+                self._script(keys=[self._key(key) for key, _, _ in rules], args=args),
+                self._timeout,
+            )
+        except (RedisError, OSError, asyncio.TimeoutError) as exc:
+            if not self._degraded:
+                logger.warning("Rate limiter falls back to local windows: %r", exc)
+                self._degraded = True
+            return self._local.hit(rules)
+        if self._degraded:
+            logger.info("Rate limiter is back on Redis")
+            self._degraded = False
+        return retry_ms / 1000
+
+
+class RotateStatus(IntEnum):
+    ROTATED = 1
+    REUSED = 0
+    REVOKED = -1
+
+
+class RefreshTokenStore:
+    FAMILY_PREFIX = "refresh_family"
+    REVOKED_KEY = "refresh_revoked"
+    REVOKED_CHANNEL = "refresh_revoked"
+    # score ставят часы разных машин, поэтому догрузка берёт записи с запасом
+    SCORE_OVERLAP = 60
+
+    def __init__(
+        self,
+        redis: Redis,
+        scripts: dict[str, AsyncScript],
+        ttl: int,
+        bloom_size: int,
+        bloom_hashes: int,
+        rebuild_interval: float,
+        full_rebuild_interval: float,
+    ):
+        self._redis = redis
+        self._scripts = scripts
+        self._ttl = ttl
+        self._bloom_size = bloom_size
+        self._bloom_hashes = bloom_hashes
+        self._rebuild_interval = rebuild_interval
+        self._full_rebuild_interval = full_rebuild_interval
+        self._revoked = BloomFilter(bloom_size, bloom_hashes)
+        self._seen_score = float("-inf")
+        self._pending: list[str] | None = None
+        # Опрос ZSET подбирает сообщения pub/sub, потерянные при переподключении
+        self._pubsub = redis.pubsub()
+        self._tasks: list[asyncio.Task] = []
+        self._closing = False
+        self._watchers: dict[str, set[asyncio.Event]] = {}
+
+    def _family_key(self, family: str):
+        return f"{self.FAMILY_PREFIX}:{family}"
+
+    def _remember(self, family: str):
+        self._revoked.add(family)
+        if self._pending is not None:
+            self._pending.append(family)
+        for event in self._watchers.get(family, ()):
+            event.set()
+
+    async def wait_revoked(self, family: str):
+        event = asyncio.Event()
+        self._watchers.setdefault(family, set()).add(event)
+        try:
+            if not await self.is_revoked(family):
+                await event.wait()
+        finally:
+            watchers = self._watchers[family]
+            watchers.discard(event)
+            if not watchers:
+                del self._watchers[family]
 
-    async def set(self, room_id: int, value: str, ttl: int = 60 * 60 * 24):
-        await self._redis.set(self._key(str(room_id)), value, ttl)
+    async def start(self):
+        if self._tasks:
+            return
+        # Подписка до пересборки: отзыв между ними не потеряется
+        await self._pubsub.subscribe(self.REVOKED_CHANNEL)
+        await self.rebuild()
+        self._tasks = [
+            asyncio.create_task(self._rebuild_loop()),
+            asyncio.create_task(self._listen()),
+        ]
+
+    async def close(self):
+        self._closing = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._pubsub.aclose()
+
+    async def issue(self, family: str, jti: str):
+        await self._redis.set(self._family_key(family), jti, self._ttl)
+
+    async def rotate(self, family: str, jti: str, new_jti: str) -> RotateStatus:
+        status = RotateStatus(
+            await self._scripts["rotate_refresh"](
+                keys=[self._family_key(family), self.REVOKED_KEY],
+                args=[jti, new_jti, self._ttl, family],
+            )
+        )
+        if status != RotateStatus.ROTATED:
+            self._remember(family)
+        if status == RotateStatus.REUSED:
+            await self._redis.publish(self.REVOKED_CHANNEL, family)
+        return status
+
+    async def revoke(self, family: str):
+        self._remember(family)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._family_key(family))
+            pipe.zadd(self.REVOKED_KEY, {family: time.time() + self._ttl})
+            pipe.publish(self.REVOKED_CHANNEL, family)
+            await pipe.execute()
+
+    async def is_revoked(self, family: str) -> bool:
+        if family not in self._revoked:
+            return False
+        expires_at = await self._redis.zscore(self.REVOKED_KEY, family)
+        return expires_at is not None and expires_at > time.time()
+
+    async def refresh(self):
+        entries = await self._redis.zrangebyscore(
+            self.REVOKED_KEY,
+            self._seen_score - self.SCORE_OVERLAP,
+            "+inf",
+            withscores=True,
+        )
+        for family, _ in entries:
+            self._remember(family)
+        if entries:
+            self._seen_score = max(self._seen_score, entries[-1][1])
+
+    async def rebuild(self):
+        self._pending = []
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.zremrangebyscore(self.REVOKED_KEY, "-inf", time.time())
+                pipe.zrange(self.REVOKED_KEY, 0, -1)
+                pipe.zrange(self.REVOKED_KEY, -1, -1, withscores=True)
+                _, families, last = await pipe.execute()
+            revoked = await asyncio.to_thread(self._build, families)
+            for family in self._pending:
+                revoked.add(family)
+            self._revoked = revoked
+            if last:
+                self._seen_score = max(self._seen_score, last[0][1])
+        finally:
+            self._pending = None
+
+    def _build(self, families: list[str]) -> BloomFilter:
+        revoked = BloomFilter(self._bloom_size, self._bloom_hashes)
+        for family in families:
+            revoked.add(family)
+        return revoked
+
+    async def _rebuild_loop(self):
+        rebuilt_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self._rebuild_interval)
+            try:
+                if time.monotonic() - rebuilt_at >= self._full_rebuild_interval:
+                    await self.rebuild()
+                    rebuilt_at = time.monotonic()
+                else:
+                    await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Revoked refresh families rebuild failed")
+
+    async def _listen(self):
+        while not self._closing:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Refresh revocations subscriber failed, retrying")
+                await asyncio.sleep(1)
+                continue
+            if message is not None and message["type"] == "message":
+                self._remember(message["data"])
+
+
+class TaskListCache:
+    KEY_PREFIX = "task_list"
+    # Под старым префиксом лежали счётчики без эпохи
+    GENERATION_PREFIX = "task_version"
+    GENERATION_TTL = 60 * 60 * 24 * 7
+
+    def __init__(self, redis: Redis, scripts: dict[str, AsyncScript], ttl: int = 60):
+        self._redis = redis
+        self._scripts = scripts
+        self._ttl = ttl
+
+    def _generation_key(self, scope: str, scope_id: int):
+        return f"{self.GENERATION_PREFIX}:{scope}:{scope_id}"
+
+    def _key(self, scope: str, scope_id: int, generation: str, parts: tuple):
+        suffix = ":".join(str(part) for part in parts)
+        return f"{self.KEY_PREFIX}:{scope}:{scope_id}:{generation}:{suffix}"
+
+    async def generation(self, scope: str, scope_id: int) -> tuple[str, float | None]:
+        # Эпоха меняется после потери ключа, поэтому версия для клиента монотонна
+        epoch, generation, bumped_at = await self._scripts["read_generation"](
+            keys=[self._generation_key(scope, scope_id)],
+            args=[uuid4().hex[:12], self.GENERATION_TTL],
+        )
+        return (
+            f"{epoch}.{generation or 0}",
+            float(bumped_at) if bumped_at else None,
+        )
+
+    async def get(self, scope: str, scope_id: int, generation: str, *parts):
+        # Ключ включает версию: после bump старые записи доживают TTL, SCAN не нужен
+        return await self._redis.get(self._key(scope, scope_id, generation, parts))
+
+    async def set(self, scope: str, scope_id: int, generation: str, value: str, *parts):
+        await self._redis.set(
+            self._key(scope, scope_id, generation, parts), value, self._ttl
+        )
+
+    async def bump(self, scope: str, scope_id: int):
+        await self._scripts["bump_generation"](
+            keys=[self._generation_key(scope, scope_id)],
+            args=[uuid4().hex[:12], self.GENERATION_TTL, time.time()],
+        )
+
+
+class RoomEventBus:
+    CHANNEL_PREFIX = "room_events"
+
+    def __init__(self, redis: Redis, queue_size: int = 100):
+        self._redis = redis
+        self._queue_size = queue_size
+        self._pubsub = redis.pubsub()
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+        self._lock = asyncio.Lock()
+        self._reader: asyncio.Task | None = None
+        self._closing = False
+
+    def _channel(self, room_id: int):
+        return f"{self.CHANNEL_PREFIX}:{room_id}"
+
+    async def start(self):
+        if self._reader is not None:
+            return
+        await self._pubsub.connect()
+        self._reader = asyncio.create_task(self._read())
+
+    async def close(self):
+        # Отмену может проглотить таймаут чтения в redis-py, поэтому цикл
+        # дополнительно проверяет флаг
+        self._closing = True
+        if self._reader is not None:
+            self._reader.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._reader
+            self._reader = None
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._drop(queue)
+        self._subscribers.clear()
+        await self._pubsub.aclose()
+
+    async def publish(self, room_id: int, event: dict):
+        await self._redis.publish(self._channel(room_id), json.dumps(event))
+
+    async def subscribe(self, room_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        async with self._lock:
+            queues = self._subscribers.setdefault(room_id, set())
+            queues.add(queue)
+            if len(queues) == 1:
+                await self._pubsub.subscribe(self._channel(room_id))
+        return queue
+
+    async def unsubscribe(self, room_id: int, queue: asyncio.Queue):
+        async with self._lock:
+            queues = self._subscribers.get(room_id)
+            if not queues or queue not in queues:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[room_id]
+                await self._pubsub.unsubscribe(self._channel(room_id))
+
+    @staticmethod
+    def _drop(queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _read(self):
+        while not self._closing:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Room events subscriber failed, retrying")
+                await asyncio.sleep(1)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            room_id = int(message["channel"].rsplit(":", 1)[1])
+            for queue in tuple(self._subscribers.get(room_id, ())):
+                try:
+                    queue.put_nowait(message["data"])
+                except asyncio.QueueFull:
+                    # Медленный клиент не тормозит остальных: после переподключения он
+                    # догонит через /changes
+                    self._drop(queue)
 
 
 confirm_codes_cache = None  # type: VerificationCodesCache | None
 reset_codes_cache = None  # type: ResetCodesCache | None
 invites_codes_cache = None  # type: InvitesCodesCaches | None
+principal_cache = None  # type: PrincipalCache | None
+room_members_cache = None  # type: RoomMembersCache | None
+task_list_cache = None  # type: TaskListCache | None
+room_events = None  # type: RoomEventBus | None
+rate_limiter = None  # type: RateLimiter | None
+refresh_tokens = None  # type: RefreshTokenStore | None
 
 
 def get_confirm_codes_cache() -> "VerificationCodesCache":
@@ -85,3 +662,39 @@ def get_invites_codes_cache() -> "InvitesCodesCaches":
     if invites_codes_cache is None:
         raise RuntimeError("Cache is not initialized yet")
     return invites_codes_cache
+
+
+def get_principal_cache() -> "PrincipalCache":
+    if principal_cache is None:
+        raise RuntimeError("Cache is not initialized yet")
+    return principal_cache
+
+
+def get_room_members_cache() -> "RoomMembersCache":
+    if room_members_cache is None:
+        raise RuntimeError("Cache is not initialized yet")
+    return room_members_cache
+
+
+def get_task_list_cache() -> "TaskListCache":
+    if task_list_cache is None:
+        raise RuntimeError("Cache is not initialized yet")
+    return task_list_cache
+
+
+def get_room_events() -> "RoomEventBus":
+    if room_events is None:
+        raise RuntimeError("Room events are not initialized yet")
+    return room_events
+
+
+def get_rate_limiter() -> "RateLimiter":
+    if rate_limiter is None:
+        raise RuntimeError("Rate limiter is not initialized yet")
+    return rate_limiter
+
+
+def get_refresh_tokens() -> "RefreshTokenStore":
+    if refresh_tokens is None:
+        raise RuntimeError("Refresh token store is not initialized yet")
+    return refresh_tokens
@@ -0,0 +1,170 @@
+# KEYS[1] - хэш {code, attempts}; ARGV[1] - код, ARGV[2] - число попыток.
+# 1 - погашен, 0 - кода нет, -1 - неверный, -2 - неверный, попытки исчерпаны
+CONSUME_CODE = """
+local stored = redis.call('HGET', KEYS[1], 'code')
+if not stored then
+    return 0
+end
+if stored == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+    return -2
+end
+return -1
+"""
+
+# ARGV[1] - прочитанный хэш кода. 1 - погашен, 0 - код сменился или уже погашен
+CONSUME_IF_EQUAL = """
+if redis.call('HGET', KEYS[1], 'code') == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+# EXISTS не даёт HINCRBY создать ключ без TTL. Ответ как у CONSUME_CODE
+REGISTER_FAILURE = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+if attempts >= tonumber(ARGV[1]) then
+    redis.call('DEL', KEYS[1])
+    return -2
+end
+return -1
+"""
+
+# ARGV[1] - код, ARGV[2] - TTL, ARGV[3] - число использований, 0 - без ограничения
+ISSUE_INVITE = """
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'code', ARGV[1])
+if tonumber(ARGV[3]) > 0 then
+    redis.call('HSET', KEYS[1], 'uses', ARGV[3])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# 1 - использование списано, 0 - кода нет или не совпал
+REDEEM_INVITE = """
+if redis.call('HGET', KEYS[1], 'code') ~= ARGV[1] then
+    return 0
+end
+local uses = redis.call('HGET', KEYS[1], 'uses')
+if uses then
+    if tonumber(uses) <= 1 then
+        redis.call('DEL', KEYS[1])
+    else
+        redis.call('HINCRBY', KEYS[1], 'uses', -1)
+    end
+end
+return 1
+"""
+
+# KEYS - окна, ARGV[1] - id попытки, далее пары limit, window_ms.
+# Попытка засчитывается во все окна или ни в одно; ответ - мс до повтора.
+# Время берём у Redis: часы воркеров могут расходиться
+SLIDING_WINDOW = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local retry = 0
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i * 2])
+    local window = tonumber(ARGV[i * 2 + 1])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= limit then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        retry = math.max(retry, tonumber(oldest[2]) + window - now, 1)
+    end
+end
+if retry > 0 then
+    return retry
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[1])
+    redis.call('PEXPIRE', key, ARGV[i * 2 + 1])
+end
+return 0
+"""
+
+# KEYS[1] - jti семейства, KEYS[2] - ZSET отозванных; ARGV - jti, новый jti,
+# TTL, семейство. 1 - ротирован, 0 - повтор старого токена, -1 - уже отозвано
+ROTATE_REFRESH = """
+if redis.call('ZSCORE', KEYS[2], ARGV[4]) then
+    return -1
+end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+local time = redis.call('TIME')
+redis.call('DEL', KEYS[1])
+redis.call('ZADD', KEYS[2], tonumber(time[1]) + tonumber(ARGV[3]), ARGV[4])
+return 0
+"""
+
+# Эпоха и счётчик в одном хэше истекают только вместе: новый хэш получает
+# новую эпоху, и счётчик не повторяет старых ETag. Ответ - {epoch, gen, at}
+READ_GENERATION = """
+if redis.call('HSETNX', KEYS[1], 'epoch', ARGV[1]) == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return redis.call('HMGET', KEYS[1], 'epoch', 'gen', 'at')
+"""
+
+BUMP_GENERATION = """
+redis.call('HSETNX', KEYS[1], 'epoch', ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'gen', 1)
+redis.call('HSET', KEYS[1], 'at', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# KEYS[1] - участники, KEYS[2] - версия {gen, at}; ARGV - gen до запроса в базу,
+# TTL, окно отставания реплики, далее поле-значение. Загрузка, начатая до
+# invalidate или внутри окна, не записывается
+LOAD_MEMBERS = """
+local version = redis.call('HMGET', KEYS[2], 'gen', 'at')
+if (version[1] or '') ~= ARGV[1] then
+    return 0
+end
+if version[2] then
+    local time = redis.call('TIME')
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    if now - tonumber(version[2]) < tonumber(ARGV[3]) then
+        return 0
+    end
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# Версия должна пережить любую загрузку, начатую до invalidate
+INVALIDATE_MEMBERS = """
+local time = redis.call('TIME')
+redis.call('DEL', KEYS[1])
+redis.call('HINCRBY', KEYS[2], 'gen', 1)
+redis.call('HSET', KEYS[2], 'at', time[1] .. '.' .. string.format('%06d', time[2]))
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return 1
+"""
+
+SCRIPTS = {
+    "consume_code": CONSUME_CODE,
+    "consume_if_equal": CONSUME_IF_EQUAL,
+    "register_failure": REGISTER_FAILURE,
+    "issue_invite": ISSUE_INVITE,
+    "redeem_invite": REDEEM_INVITE,
+    "sliding_window": SLIDING_WINDOW,
+    "rotate_refresh": ROTATE_REFRESH,
+    "read_generation": READ_GENERATION,
+    "bump_generation": BUMP_GENERATION,
+    "load_members": LOAD_MEMBERS,
+    "invalidate_members": INVALIDATE_MEMBERS,
+}
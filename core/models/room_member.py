@@ -2,9 +2,10 @@ from datetime import datetime
 from enum import Enum
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Enum as SQLEnum, TIMESTAMP, func, ForeignKey
+from sqlalchemy import Enum as SQLEnum, TIMESTAMP, func, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from core.models import Base
+from core.models.base import LAZY_STRATEGY
 from core.models.mixins import UserRelationship
 
 if TYPE_CHECKING:
@@ -19,6 +20,9 @@ class Roles(Enum):
 
 class Room_Member(Base, UserRelationship):
     _user_back_populates = "room_members"
+    __table_args__ = (
+        Index("uq_room_members_room_user", "room_id", "user_id", unique=True),
+    )
     role: Mapped["Roles"] = mapped_column(
         SQLEnum(Roles, name="roles_enum", native_enum=True),
         default=Roles.MEMBER,
@@ -28,4 +32,4 @@ class Room_Member(Base, UserRelationship):
         TIMESTAMP, server_default=func.now(), nullable=False
     )
     room_id: Mapped["int"] = mapped_column(ForeignKey("rooms.id"))
-    room: Mapped["Room"] = relationship(back_populates="members")
+    room: Mapped["Room"] = relationship(back_populates="members", lazy=LAZY_STRATEGY)
@@ -4,6 +4,7 @@ from typing import TYPE_CHECKING
 from sqlalchemy import func, TIMESTAMP, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from core.models import Base
+from core.models.base import LAZY_STRATEGY
 
 if TYPE_CHECKING:
     from core.models import Task
@@ -17,6 +18,10 @@ class Room(Base):
     created_at: Mapped[datetime] = mapped_column(
         TIMESTAMP(timezone=True), server_default=func.now(), nullable=False
     )
-    user: Mapped["User"] = relationship(back_populates="rooms")
-    members: Mapped[list["Room_Member"]] = relationship(back_populates="room")
-    tasks: Mapped[list["Task"]] = relationship(back_populates="room")
+    user: Mapped["User"] = relationship(back_populates="rooms", lazy=LAZY_STRATEGY)
+    members: Mapped[list["Room_Member"]] = relationship(
+        back_populates="room", lazy=LAZY_STRATEGY
+    )
+    tasks: Mapped[list["Task"]] = relationship(
+        back_populates="room", lazy=LAZY_STRATEGY
+    )
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from sqlalchemy import TIMESTAMP, BigInteger, Index, func
+from sqlalchemy import Enum as SQLEnum
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.models.base import Base
+from core.models.tasks import OwnerType
+
+
+class TaskTombstone(Base):
+    __tablename__ = "task_tombstones"
+    __table_args__ = (
+        Index(
+            "ix_task_tombstones_user_owner_seq", "user_id", "owner_type", "change_seq"
+        ),
+        Index(
+            "ix_task_tombstones_room_owner_seq", "room_id", "owner_type", "change_seq"
+        ),
+    )
+    task_id: Mapped[int] = mapped_column(nullable=False)
+    user_id: Mapped[int] = mapped_column(nullable=False)
+    room_id: Mapped[int | None] = mapped_column(nullable=True)
+    owner_type: Mapped["OwnerType"] = mapped_column(
+        SQLEnum(OwnerType, name="owner_type", native_enum=True, create_type=False)
+    )
+    change_seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now(), nullable=False
+    )
@@ -2,11 +2,23 @@ from datetime import datetime, timezone
 from enum import Enum
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Text, DATETIME, func, TIMESTAMP, String, ForeignKey
+from sqlalchemy import (
+    Text,
+    DATETIME,
+    func,
+    TIMESTAMP,
+    String,
+    ForeignKey,
+    Index,
+    BigInteger,
+    FetchedValue,
+    Computed,
+)
 from sqlalchemy import Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from core.models.base import Base
+from core.models.base import Base, LAZY_STRATEGY
 from core.models.mixins import UserRelationship
 
 if TYPE_CHECKING:
@@ -14,6 +26,13 @@ if TYPE_CHECKING:
     from core.models.users import User
 
 
+SEARCH_CONFIG = "simple"
+search_vector_expression = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')"
+)
+
+
 class OwnerType(Enum):
     USER = "user"
     ROOM = "room"
@@ -21,6 +40,39 @@ class OwnerType(Enum):
 
 class Task(Base):
     _user_back_populates = "tasks"
+    __table_args__ = (
+        Index(
+            "ix_tasks_user_owner_created", "user_id", "owner_type", "created_at", "id"
+        ),
+        Index("ix_tasks_user_owner_due", "user_id", "owner_type", "due_at", "id"),
+        Index(
+            "ix_tasks_room_owner_created", "room_id", "owner_type", "created_at", "id"
+        ),
+        Index("ix_tasks_room_owner_due", "room_id", "owner_type", "due_at", "id"),
+        Index(
+            "ix_tasks_user_owner_completed", "user_id", "owner_type", "completed", "id"
+        ),
+        Index(
+            "ix_tasks_user_owner_completed_at",
+            "user_id",
+            "owner_type",
+            "completed_at",
+            "id",
+        ),
+        Index(
+            "ix_tasks_room_owner_completed", "room_id", "owner_type", "completed", "id"
+        ),
+        Index(
+            "ix_tasks_room_owner_completed_at",
+            "room_id",
+            "owner_type",
+            "completed_at",
+            "id",
+        ),
+        Index("ix_tasks_user_owner_seq", "user_id", "owner_type", "change_seq"),
+        Index("ix_tasks_room_owner_seq", "room_id", "owner_type", "change_seq"),
+        Index("ix_tasks_search_vector", "search_vector", postgresql_using="gin"),
+    )
     title: Mapped[str] = mapped_column(String, nullable=False)
     description: Mapped[str] = mapped_column(
         Text,
@@ -40,11 +92,29 @@ class Task(Base):
     completed_at: Mapped[datetime] = mapped_column(
         TIMESTAMP(timezone=True), nullable=True
     )
+    # Оба поля выставляет триггер tasks_track_change (миграция 0003)
+    updated_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        server_default=func.now(),
+        server_onupdate=FetchedValue(),
+        nullable=False,
+    )
+    change_seq: Mapped[int] = mapped_column(
+        BigInteger,
+        server_default="0",
+        server_onupdate=FetchedValue(),
+        nullable=False,
+    )
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(search_vector_expression, persisted=True),
+        deferred=True,
+    )
     owner_type: Mapped["OwnerType"] = mapped_column(
         SQLEnum(OwnerType, name="owner_type", native_enum=True), default=OwnerType.USER
     )
     room_id: Mapped[int] = mapped_column(ForeignKey("rooms.id"), nullable=True)
-    room: Mapped["Room"] = relationship(back_populates="tasks")
+    room: Mapped["Room"] = relationship(back_populates="tasks", lazy=LAZY_STRATEGY)
 
     assigned_id: Mapped[int | None] = mapped_column(
         ForeignKey("users.id"), nullable=True
@@ -53,6 +123,7 @@ class Task(Base):
         "User",
         back_populates="assigned_tasks",
         foreign_keys=[assigned_id],
+        lazy=LAZY_STRATEGY,
     )
 
     user_id: Mapped[int] = mapped_column(
@@ -60,5 +131,5 @@ class Task(Base):
         nullable=False,
     )
     user: Mapped["User"] = relationship(
-        "User", back_populates="tasks", foreign_keys=[user_id]
+        "User", back_populates="tasks", foreign_keys=[user_id], lazy=LAZY_STRATEGY
     )
@@ -5,6 +5,7 @@ from sqlalchemy import TIMESTAMP, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from core.models import Base
+from core.models.base import LAZY_STRATEGY
 
 if TYPE_CHECKING:
     from core.models.tasks import Task
@@ -23,10 +24,17 @@ class User(Base):
         nullable=False,
     )
     tasks: Mapped[list["Task"]] = relationship(
-        back_populates="user", foreign_keys="Task.user_id"
+        back_populates="user", foreign_keys="Task.user_id", lazy=LAZY_STRATEGY
     )
     assigned_tasks: Mapped[list["Task"]] = relationship(
-        "Task", back_populates="assignee", foreign_keys="Task.assigned_id"
+        "Task",
+        back_populates="assignee",
+        foreign_keys="Task.assigned_id",
+        lazy=LAZY_STRATEGY,
+    )
+    room_members: Mapped[list["Room_Member"]] = relationship(
+        back_populates="user", lazy=LAZY_STRATEGY
+    )
+    rooms: Mapped[list["Room"]] = relationship(
+        back_populates="user", lazy=LAZY_STRATEGY
     )
-    room_members: Mapped[list["Room_Member"]] = relationship(back_populates="user")
-    rooms: Mapped[list["Room"]] = relationship(back_populates="user")
@@ -0,0 +1,81 @@
+import functools
+import logging
+from contextlib import contextmanager
+from typing import Iterator
+
+from core.config import setting
+from core.instrumentation import global_statement_counters, statement_counters
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def add(self, statement: str):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(process_wide: bool = False) -> Iterator[QueryCounter]:
+    counter = QueryCounter()
+    if process_wide:
+        global_statement_counters.append(counter)
+        try:
+            yield counter
+        finally:
+            global_statement_counters.remove(counter)
+        return
+    token = statement_counters.set((*statement_counters.get(), counter))
+    try:
+        yield counter
+    finally:
+        statement_counters.reset(token)
+
+
+def check_budget(counter: QueryCounter, budget: int, name: str, strict: bool):
+    if counter.count <= budget:
+        return
+    message = "%s ran %d SQL statements, budget is %d:\n%s" % (
+        name,
+        counter.count,
+        budget,
+        "\n".join(counter.statements),
+    )
+    if strict:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+@contextmanager
+def assert_query_budget(
+    budget: int, process_wide: bool = True
+) -> Iterator[QueryCounter]:
+    with count_queries(process_wide) as counter:
+        yield counter
+    check_budget(counter, budget, "Block", strict=True)
+
+
+def query_budget(budget: int):
+    # Зависимости не считаются: их стоимость не зависит от ручки
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            with count_queries() as counter:
+                result = await endpoint(*args, **kwargs)
+            check_budget(counter, budget, endpoint.__qualname__, setting.testing)
+            return result
+
+        wrapper.query_budget = budget
+        return wrapper
+
+    return decorator
@@ -0,0 +1,72 @@
+import math
+from functools import lru_cache
+
+from fastapi import HTTPException, Request
+from starlette.types import Scope
+
+from core.config import setting
+from core.models.redis_helper import get_rate_limiter
+
+
+@lru_cache
+def parse_rate(rate: str) -> tuple[int, float]:
+    limit, window = rate.split("/")
+    return int(limit), float(window)
+
+
+def client_ip(scope: Scope) -> str:
+    # В --forwarded-allow-ips должен быть только сам прокси, иначе клиент
+    # выберет себе IP заголовком X-Forwarded-For
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def retry_after_header(retry_after: float) -> str:
+    return str(max(math.ceil(retry_after), 1))
+
+
+async def request_email(request: Request) -> str | None:
+    email = request.query_params.get("email")
+    if email is None:
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith(
+            ("application/x-www-form-urlencoded", "multipart/form-data")
+        ):
+            form = await request.form()
+            # OAuth2PasswordRequestForm присылает email в поле username
+            email = form.get("email") or form.get("username")
+        elif content_type.startswith("application/json"):
+            try:
+                body = await request.json()
+            except ValueError:
+                body = None
+            if isinstance(body, dict):
+                email = body.get("email")
+    if not isinstance(email, str) or not email:
+        return None
+    return email.strip().lower()
+
+
+def rate_limit(name: str):
+    async def dependency(request: Request):
+        rules = setting.rate_limits.get(name)
+        if not setting.rate_limit_enabled or not rules:
+            return
+        values = {"ip": client_ip(request.scope)}
+        if "email" in rules:
+            values["email"] = await request_email(request)
+        checks = []
+        for key, rate in rules.items():
+            if values.get(key) is None:
+                continue
+            limit, window = parse_rate(rate)
+            checks.append((f"{name}:{key}:{values[key]}", limit, window))
+        retry_after = await get_rate_limiter().hit(checks)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": retry_after_header(retry_after)},
+            )
+
+    return dependency
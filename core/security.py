@@ -1,22 +1,41 @@
 import datetime
 import os
+from uuid import uuid4
 
 import jwt
-from fastapi import HTTPException, Depends, Cookie
+from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
+from pydantic import BaseModel, ConfigDict
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import setting
+from core.hasher import password_hasher
 from core.models import db_helper
+from core.models.redis_helper import (
+    PrincipalCache,
+    RefreshTokenStore,
+    RotateStatus,
+    get_principal_cache,
+    get_refresh_tokens,
+)
 from core.models.users import User
 
-hashed_content = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def create_jwt_token(user_id: int, token_type: str, time_in_minutes: int = 15):
+class Principal(BaseModel):
+    id: int
+    email: str
+    is_active: bool
+    is_verified: bool | None
+    model_config = ConfigDict(from_attributes=True)
+
+
+def create_jwt_token(
+    user_id: int, token_type: str, time_in_minutes: int = 15, **claims
+):
     now = datetime.datetime.now(datetime.timezone.utc)
     exp = now + datetime.timedelta(minutes=time_in_minutes)
     payload = {
@@ -24,6 +43,7 @@ def create_jwt_token(user_id: int, token_type: str, time_in_minutes: int = 15):
         "token_type": token_type,
         "iat": now,
         "exp": exp,
+        **claims,
     }
     return jwt.encode(
         payload,
@@ -44,37 +64,108 @@ def get_user_id_by_token(token: str):
         raise HTTPException(status_code=403, detail="Forbidden")
 
 
-def create_password_hash(password: str) -> str:
-    return hashed_content.hash(password)
+async def create_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
-def verify_password(password: str, password_hash: str) -> bool:
-    return hashed_content.verify(password, password_hash)
+async def verify_password(password: str, password_hash: str) -> bool:
+    return await password_hasher.verify(password, password_hash)
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    session: AsyncSession = Depends(db_helper.session_dependency),
-) -> User:
-    payload = decode_jwt_token(token)
+async def get_principal(
+    session: AsyncSession, cache: PrincipalCache, user_id: int
+) -> Principal | None:
+    cached = await cache.get(user_id)
+    if cached is not None:
+        return Principal.model_validate(cached)
+    user = await session.get(User, user_id)
+    if user is None:
+        return None
+    principal = Principal.model_validate(user)
+    await cache.set(user_id, principal.model_dump())
+    return principal
+
+
+async def get_principal_by_token(
+    session: AsyncSession,
+    cache: PrincipalCache,
+    tokens: RefreshTokenStore,
+    token: str,
+) -> Principal:
+    try:
+        payload = decode_jwt_token(token)
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid Token")
     user_id = payload.get("sub")
     if user_id is None:
         raise HTTPException(status_code=401, detail="Invalid Token")
-    user = await session.get(User, int(user_id))
+    family = payload.get("fam")
+    if family is not None and await tokens.is_revoked(family):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    user = await get_principal(session, cache, int(user_id))
     if user is None or not user.is_active:
         raise HTTPException(status_code=401, detail="User not found or inactive")
     return user
 
 
-def token_refresh(refresh_token: str | None = Cookie(default=None)):
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(db_helper.session_dependency),
+    cache: PrincipalCache = Depends(get_principal_cache),
+    tokens: RefreshTokenStore = Depends(get_refresh_tokens),
+) -> Principal:
+    return await get_principal_by_token(session, cache, tokens, token)
+
+
+def _token_pair(user_id: int, family: str, jti: str) -> tuple[str, str]:
+    return (
+        create_jwt_token(user_id, token_type="access", fam=family),
+        create_jwt_token(
+            user_id,
+            token_type="refresh",
+            time_in_minutes=setting.refresh_token_minutes,
+            jti=jti,
+            fam=family,
+        ),
+    )
+
+
+async def issue_tokens(user_id: int, tokens: RefreshTokenStore) -> tuple[str, str]:
+    family, jti = uuid4().hex, uuid4().hex
+    await tokens.issue(family, jti)
+    return _token_pair(user_id, family, jti)
+
+
+def decode_refresh_token(refresh_token: str | None) -> dict:
     if not refresh_token:
         raise HTTPException(
             status_code=401,
             detail="Refresh token missing",
         )
-    payload = decode_jwt_token(refresh_token)
+    try:
+        payload = decode_jwt_token(refresh_token)
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
     if payload.get("token_type") != "refresh":
         raise HTTPException(status_code=401, detail="Invalid token type")
-    user_id = int(payload.get("sub"))
-    new_access_token = create_jwt_token(user_id=user_id, token_type="access")
-    return new_access_token
+    if not payload.get("jti") or not payload.get("fam"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+
+async def token_refresh(
+    refresh_token: str | None, tokens: RefreshTokenStore
+) -> tuple[str, str]:
+    payload = decode_refresh_token(refresh_token)
+    family = payload["fam"]
+    if await tokens.is_revoked(family):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    jti = uuid4().hex
+    status = await tokens.rotate(family, payload["jti"], jti)
+    if status == RotateStatus.REUSED:
+        # Повтор старого токена: скрипт уже отозвал всё семейство
+        raise HTTPException(status_code=401, detail="Refresh token reused")
+    if status == RotateStatus.REVOKED:
+        raise HTTPException(status_code=401, detail="Token revoked")
+    user_id = int(payload["sub"])
+    return _token_pair(user_id, family, jti)
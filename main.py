@@ -1,34 +1,107 @@
+import logging
+import time
 from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI
 from api.todos import router as todos_router
-from api.auth import router as auth_router
-from core.models import Base, db_helper
+from api.auth import hasher_busy_handler, router as auth_router
+from api.monitoring import router as monitoring_router
+from core.hasher import HasherBusy, password_hasher
+from core.middleware import (
+    RateLimitMiddleware,
+    ReadYourWritesMiddleware,
+    TimingMiddleware,
+)
+from core.models import db_helper
+from core.models.schema import check_schema_version
 import core.models.redis_helper as redis_module
 from core.models.redis_helper import (
     redis_helper,
     VerificationCodesCache,
     ResetCodesCache,
     InvitesCodesCaches,
+    PrincipalCache,
+    RoomMembersCache,
+    TaskListCache,
+    RoomEventBus,
+    RateLimiter,
+    RefreshTokenStore,
 )
+from core.config import setting
+
+logger = logging.getLogger("uvicorn.error")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    password_hasher.start()
     await redis_helper.connect()
-    redis_module.confirm_codes_cache = VerificationCodesCache(redis_helper.conn)
-    redis_module.reset_codes_cache = ResetCodesCache(redis_helper.conn)
-    redis_module.invites_codes_cache = InvitesCodesCaches(redis_helper.conn)
-    async with db_helper.engine.begin() as coon:
-        await coon.run_sync(Base.metadata.create_all)
+    redis_module.confirm_codes_cache = VerificationCodesCache(
+        redis_helper.conn, redis_helper.scripts
+    )
+    redis_module.reset_codes_cache = ResetCodesCache(
+        redis_helper.conn, redis_helper.scripts
+    )
+    redis_module.invites_codes_cache = InvitesCodesCaches(
+        redis_helper.conn, redis_helper.scripts
+    )
+    redis_module.principal_cache = PrincipalCache(
+        redis_helper.conn, ttl=setting.principal_ttl
+    )
+    await redis_module.principal_cache.start()
+    redis_module.room_members_cache = RoomMembersCache(
+        redis_helper.conn,
+        redis_helper.scripts,
+        ttl=setting.room_members_ttl,
+        stale_window=setting.db_replica_max_lag if setting.db_replica_urls else 0,
+    )
+    redis_module.task_list_cache = TaskListCache(
+        redis_helper.conn, redis_helper.scripts, ttl=setting.task_list_cache_ttl
+    )
+    redis_module.room_events = RoomEventBus(
+        redis_helper.conn, queue_size=setting.room_events_queue_size
+    )
+    await redis_module.room_events.start()
+    redis_module.rate_limiter = RateLimiter(
+        redis_helper.scripts["sliding_window"],
+        timeout=setting.rate_limit_redis_timeout,
+        local_size=setting.rate_limit_local_size,
+    )
+    redis_module.refresh_tokens = RefreshTokenStore(
+        redis_helper.conn,
+        redis_helper.scripts,
+        ttl=setting.refresh_token_minutes * 60,
+        bloom_size=setting.refresh_bloom_size,
+        bloom_hashes=setting.refresh_bloom_hashes,
+        rebuild_interval=setting.refresh_bloom_rebuild_interval,
+        full_rebuild_interval=setting.refresh_bloom_full_rebuild_interval,
+    )
+    await redis_module.refresh_tokens.start()
+    await check_schema_version(db_helper.engine)
+    await db_helper.start(lag_check_interval=setting.db_replica_lag_check_interval)
+    app.state.startup_seconds = time.perf_counter() - started
+    logger.info("Worker started in %.1f ms", app.state.startup_seconds * 1000)
     yield
+    await redis_module.refresh_tokens.close()
+    await redis_module.room_events.close()
+    await redis_module.principal_cache.close()
     await redis_helper.close()
+    await db_helper.close()
+    password_hasher.close()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_exception_handler(HasherBusy, hasher_busy_handler)
+if setting.db_replica_urls:
+    app.add_middleware(ReadYourWritesMiddleware, max_lag=setting.db_replica_max_lag)
+if setting.rate_limit_enabled and setting.rate_limit_global:
+    app.add_middleware(RateLimitMiddleware, rate=setting.rate_limit_global)
+app.add_middleware(TimingMiddleware)
 app.include_router(router=auth_router)
 app.include_router(router=todos_router)
+app.include_router(router=monitoring_router)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
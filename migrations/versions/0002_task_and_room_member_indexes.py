@@ -0,0 +1,76 @@
+"""task and room member indexes
+
+Составные индексы под реальные запросы списков задач (фильтр по
+владельцу + keyset-сортировка по (поле, id)), частичный индекс по
+незавершённым задачам и уникальность (room_id, user_id) у участников.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_tasks_user_owner_created",
+        "tasks",
+        ["user_id", "owner_type", "created_at", "id"],
+    )
+    op.create_index(
+        "ix_tasks_user_owner_due",
+        "tasks",
+        ["user_id", "owner_type", "due_at", "id"],
+    )
+    op.create_index(
+        "ix_tasks_room_owner_created",
+        "tasks",
+        ["room_id", "owner_type", "created_at", "id"],
+    )
+    op.create_index(
+        "ix_tasks_room_owner_due",
+        "tasks",
+        ["room_id", "owner_type", "due_at", "id"],
+    )
+    op.create_index(
+        "ix_tasks_incomplete_due",
+        "tasks",
+        ["user_id", "due_at"],
+        postgresql_where=sa.text("NOT completed"),
+    )
+    # До этого уникальность не проверялась, дубликаты оставляем по первой записи
+    op.execute("""
+        DELETE FROM room_members a
+        USING room_members b
+        WHERE a.room_id = b.room_id
+          AND a.user_id = b.user_id
+          AND a.id > b.id
+        """)
+    op.create_index(
+        "uq_room_members_room_user",
+        "room_members",
+        ["room_id", "user_id"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uq_room_members_room_user", table_name="room_members")
+    op.drop_index("ix_tasks_incomplete_due", table_name="tasks")
+    op.drop_index("ix_tasks_room_owner_due", table_name="tasks")
+    op.drop_index("ix_tasks_room_owner_created", table_name="tasks")
+    op.drop_index("ix_tasks_user_owner_due", table_name="tasks")
+    op.drop_index("ix_tasks_user_owner_created", table_name="tasks")
@@ -0,0 +1,127 @@
+"""task change tracking and tombstones
+
+updated_at / change_seq у задач и таблица task_tombstones для
+GET /tasks/changes. Значения выставляют триггеры, поэтому их не обойдёт
+ни ORM, ни bulk UPDATE/DELETE.
+
+change_seq = pg_current_xact_id() транзакции, изменившей строку. В
+отличие от значения из последовательности, он позволяет отдавать только
+изменения транзакций младше pg_snapshot_xmin, то есть уже завершённых,
+и токен синхронизации не перескакивает через незакоммиченные строки.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:20:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "tasks",
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.add_column(
+        "tasks",
+        sa.Column("change_seq", sa.BigInteger(), server_default="0", nullable=False),
+    )
+    op.create_index(
+        "ix_tasks_user_owner_seq", "tasks", ["user_id", "owner_type", "change_seq"]
+    )
+    op.create_index(
+        "ix_tasks_room_owner_seq", "tasks", ["room_id", "owner_type", "change_seq"]
+    )
+    op.create_table(
+        "task_tombstones",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("task_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("room_id", sa.Integer(), nullable=True),
+        sa.Column(
+            "owner_type",
+            postgresql.ENUM("USER", "ROOM", name="owner_type", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("change_seq", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "deleted_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_task_tombstones_user_owner_seq",
+        "task_tombstones",
+        ["user_id", "owner_type", "change_seq"],
+    )
+    op.create_index(
+        "ix_task_tombstones_room_owner_seq",
+        "task_tombstones",
+        ["room_id", "owner_type", "change_seq"],
+    )
+    op.execute("""
+        CREATE FUNCTION tasks_track_change() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_seq := pg_current_xact_id()::text::bigint;
+            NEW.updated_at := now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """)
+    op.execute("""
+        CREATE TRIGGER tasks_track_change
+        BEFORE INSERT OR UPDATE ON tasks
+        FOR EACH ROW EXECUTE FUNCTION tasks_track_change()
+        """)
+    op.execute("""
+        CREATE FUNCTION tasks_tombstone() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO task_tombstones
+                (task_id, user_id, room_id, owner_type, change_seq, deleted_at)
+            VALUES
+                (OLD.id, OLD.user_id, OLD.room_id, OLD.owner_type,
+                 pg_current_xact_id()::text::bigint, now());
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+        """)
+    op.execute("""
+        CREATE TRIGGER tasks_tombstone
+        AFTER DELETE ON tasks
+        FOR EACH ROW EXECUTE FUNCTION tasks_tombstone()
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER tasks_tombstone ON tasks")
+    op.execute("DROP FUNCTION tasks_tombstone()")
+    op.execute("DROP TRIGGER tasks_track_change ON tasks")
+    op.execute("DROP FUNCTION tasks_track_change()")
+    op.drop_index("ix_task_tombstones_room_owner_seq", table_name="task_tombstones")
+    op.drop_index("ix_task_tombstones_user_owner_seq", table_name="task_tombstones")
+    op.drop_table("task_tombstones")
+    op.drop_index("ix_tasks_room_owner_seq", table_name="tasks")
+    op.drop_index("ix_tasks_user_owner_seq", table_name="tasks")
+    op.drop_column("tasks", "change_seq")
+    op.drop_column("tasks", "updated_at")
@@ -0,0 +1,61 @@
+"""task completed ordering indexes
+
+Keyset-индексы для сортировок по completed и completed_at, которые
+принимают списки задач. Частичный ix_tasks_incomplete_due удалён: ни один
+запрос приложения его не использует.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_tasks_user_owner_completed",
+        "tasks",
+        ["user_id", "owner_type", "completed", "id"],
+    )
+    op.create_index(
+        "ix_tasks_user_owner_completed_at",
+        "tasks",
+        ["user_id", "owner_type", "completed_at", "id"],
+    )
+    op.create_index(
+        "ix_tasks_room_owner_completed",
+        "tasks",
+        ["room_id", "owner_type", "completed", "id"],
+    )
+    op.create_index(
+        "ix_tasks_room_owner_completed_at",
+        "tasks",
+        ["room_id", "owner_type", "completed_at", "id"],
+    )
+    op.drop_index("ix_tasks_incomplete_due", table_name="tasks")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(
+        "ix_tasks_incomplete_due",
+        "tasks",
+        ["user_id", "due_at"],
+        postgresql_where=sa.text("NOT completed"),
+    )
+    op.drop_index("ix_tasks_room_owner_completed_at", table_name="tasks")
+    op.drop_index("ix_tasks_room_owner_completed", table_name="tasks")
+    op.drop_index("ix_tasks_user_owner_completed_at", table_name="tasks")
+    op.drop_index("ix_tasks_user_owner_completed", table_name="tasks")
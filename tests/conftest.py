@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+
+import fakeredis
+import pytest
+from alembic import command
+from alembic.config import Config
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+import core.models.redis_helper as redis_module
+from core.hasher import hashed_content
+from core.models.redis_helper import get_room_events
+from core.models.schema import ALEMBIC_INI
+from core.security import create_jwt_token
+
+PASSWORD = "password"
+TABLES = "task_tombstones, tasks, room_members, rooms, users"
+
+
+@dataclass
+class AuthUser:
+    id: int
+    email: str
+    headers: dict
+
+
+def run_sql(url: str, statement: str, **params) -> list:
+    async def run():
+        engine = create_async_engine(url, poolclass=NullPool)
+        try:
+            async with engine.begin() as conn:
+                result = await conn.execute(text(statement), params)
+                return result.all() if result.returns_rows else []
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def close_room_socket(websocket, room_id: int):
+    # Выход из websocket_connect отменяет обработчик, и TestClient падает
+    # с CancelledError: закрываем сами и ждём, пока обработчик отпишется
+    events = get_room_events()
+    websocket.close()
+    while room_id in events._subscribers:
+        time.sleep(0.01)
+
+
+@pytest.fixture(scope="session")
+def database_url():
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    command.upgrade(Config(str(ALEMBIC_INI)), "head")
+    return url
+
+
+@pytest.fixture
+def db(database_url):
+    run_sql(database_url, f"TRUNCATE {TABLES} RESTART IDENTITY CASCADE")
+    return database_url
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    # Свой сервер на тест; скрипты выполняет Lua из fakeredis[lua]
+    server = fakeredis.FakeServer()
+
+    class FakeRedis(fakeredis.aioredis.FakeRedis):
+        @classmethod
+        def from_url(cls, url=None, **kwargs):
+            return cls(server=server, **kwargs)
+
+    monkeypatch.setattr(redis_module, "InstrumentedRedis", FakeRedis)
+    return server
+
+
+@pytest.fixture
+def client(db, fake_redis):
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def password_hash():
+    return hashed_content.hash(PASSWORD)
+
+
+@pytest.fixture
+def make_user(db, password_hash):
+    def make(email: str = "user@example.com", verified: bool = True) -> AuthUser:
+        [(user_id,)] = run_sql(
+            db,
+            "INSERT INTO users (email, password_hash, is_verified, is_active) "
+            "VALUES (:email, :password_hash, :verified, true) RETURNING id",
+            email=email,
+            password_hash=password_hash,
+            verified=verified,
+        )
+        token = create_jwt_token(user_id, token_type="access")
+        return AuthUser(user_id, email, {"Authorization": f"Bearer {token}"})
+
+    return make
+
+
+@pytest.fixture
+def make_task(client):
+    def make(user: AuthUser, room_id: int | None = None, **fields) -> int:
+        path = f"/tasks/rooms/{room_id}" if room_id else "/tasks/"
+        payload = {
+            "title": "task",
+            "description": "",
+            "due_at": "2030-01-01T00:00:00Z",
+            **fields,
+        }
+        response = client.post(path, json=payload, headers=user.headers)
+        assert response.status_code in (200, 201), response.text
+        return response.json()["id"]
+
+    return make
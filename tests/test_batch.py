@@ -0,0 +1,27 @@
+def test_patch_batch_reports_unchanged_items(client, make_user, make_task):
+    user = make_user()
+    changed, untouched = make_task(user), make_task(user)
+
+    response = client.patch(
+        "/tasks/batch",
+        json={"items": [{"id": changed, "title": "new"}, {"id": untouched}, {"id": 0}]},
+        headers=user.headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["items"] == [
+        {"id": changed, "status": "updated"},
+        {"id": untouched, "status": "unchanged"},
+        {"id": 0, "status": "not_found"},
+    ]
+
+
+def test_patch_batch_rejects_duplicate_ids(client, make_user, make_task):
+    user = make_user()
+    task_id = make_task(user)
+
+    response = client.patch(
+        "/tasks/batch",
+        json={"items": [{"id": task_id, "title": "a"}, {"id": task_id, "title": "b"}]},
+        headers=user.headers,
+    )
+    assert response.status_code == 422
@@ -0,0 +1,62 @@
+import fakeredis
+import pytest
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def task_id(make_task, user):
+    return make_task(user, title="first")
+
+
+def conditional(user, etag: str) -> dict:
+    return {**user.headers, "If-None-Match": etag}
+
+
+@pytest.mark.parametrize("path", ["/tasks/", "/tasks/{task_id}"])
+def test_matching_etag_returns_304_without_sql(
+    client, user, task_id, query_budget, path
+):
+    path = path.format(task_id=task_id)
+    first = client.get(path, headers=user.headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    with query_budget(0):
+        response = client.get(path, headers=conditional(user, etag))
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+@pytest.mark.parametrize("path", ["/tasks/", "/tasks/{task_id}"])
+def test_bump_invalidates_etag(client, user, task_id, path):
+    path = path.format(task_id=task_id)
+    etag = client.get(path, headers=user.headers).headers["ETag"]
+
+    patched = client.patch(
+        f"/tasks/{task_id}", json={"title": "changed"}, headers=user.headers
+    )
+    assert patched.status_code == 200
+
+    response = client.get(path, headers=conditional(user, etag))
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_lost_generation_does_not_repeat_etag(client, fake_redis, user, task_id):
+    # Счётчик поколения начинается заново после потери ключа: без эпохи
+    # в теге старый ETag совпал бы с новым при другом содержимом
+    client.patch(f"/tasks/{task_id}", json={"title": "one"}, headers=user.headers)
+    etag = client.get("/tasks/", headers=user.headers).headers["ETag"]
+
+    fakeredis.FakeRedis(server=fake_redis).flushall()
+    # Столько же bump, сколько до потери (создание и правка): счётчик равен
+    for title in ("two", "three"):
+        client.patch(f"/tasks/{task_id}", json={"title": title}, headers=user.headers)
+
+    response = client.get("/tasks/", headers=conditional(user, etag))
+    assert response.status_code == 200
+    assert response.json()["items"][0]["title"] == "three"
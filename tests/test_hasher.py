@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+
+from core.hasher import HasherBusy, PasswordHasher, password_hasher
+from tests.conftest import PASSWORD
+
+
+def test_full_queue_raises_busy():
+    hasher = PasswordHasher(workers=1, max_pending=0)
+    with pytest.raises(HasherBusy):
+        asyncio.run(hasher.hash(PASSWORD))
+
+
+def test_busy_hasher_maps_to_503(client, make_user, monkeypatch):
+    user = make_user()
+    monkeypatch.setattr(password_hasher, "_max_pending", 0)
+
+    response = client.post(
+        "/auth/login", data={"username": user.email, "password": PASSWORD}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
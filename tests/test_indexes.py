@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from api.todos.crud import room_roles_query, task_list_query
+from api.todos.pagination import encode_cursor
+from core.models.tasks import OwnerType
+from core.security import Principal
+
+USER = Principal(id=1, email="user@example.com", is_active=True, is_verified=True)
+
+
+def explain(url: str, stmt) -> str:
+    sql = str(
+        stmt.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+    async def run():
+        engine = create_async_engine(url, poolclass=NullPool)
+        try:
+            async with engine.connect() as conn:
+                # На маленьких таблицах планировщик выбрал бы seq scan или
+                # сортировку; проверяем, что форма запроса ложится на индекс
+                await conn.execute(text("SET enable_seqscan = off"))
+                await conn.execute(text("SET enable_sort = off"))
+                result = await conn.execute(text(f"EXPLAIN {sql}"))
+                return "\n".join(result.scalars().all())
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+USER_INDEXES = {
+    "created_at": "ix_tasks_user_owner_created",
+    "due_at": "ix_tasks_user_owner_due",
+    "completed": "ix_tasks_user_owner_completed",
+    "completed_at": "ix_tasks_user_owner_completed_at",
+}
+ROOM_INDEXES = {
+    "created_at": "ix_tasks_room_owner_created",
+    "due_at": "ix_tasks_room_owner_due",
+    "completed": "ix_tasks_room_owner_completed",
+    "completed_at": "ix_tasks_room_owner_completed_at",
+}
+CURSOR_VALUES = {
+    "created_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+    "due_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+    "completed": True,
+    "completed_at": None,
+}
+ORDERINGS = [
+    (prefix + field, deep)
+    for field in USER_INDEXES
+    for prefix in ("", "-")
+    for deep in (False, True)
+]
+
+
+def cursor_for(order_by: str, deep: bool) -> str | None:
+    # Глубокая страница: тот же индекс должен дойти до курсора без сортировки
+    if not deep:
+        return None
+    return encode_cursor(order_by, CURSOR_VALUES[order_by.lstrip("-")], 1000)
+
+
+@pytest.mark.parametrize("order_by, deep", ORDERINGS)
+def test_user_task_list_uses_index(database_url, order_by, deep):
+    stmt = task_list_query(order_by, USER, cursor=cursor_for(order_by, deep))
+    plan = explain(database_url, stmt)
+    assert USER_INDEXES[order_by.lstrip("-")] in plan, plan
+    assert "Sort" not in plan, plan
+
+
+@pytest.mark.parametrize("order_by, deep", ORDERINGS)
+def test_room_task_list_uses_index(database_url, order_by, deep):
+    stmt = task_list_query(
+        order_by, USER, OwnerType.ROOM, room_id=1, cursor=cursor_for(order_by, deep)
+    )
+    plan = explain(database_url, stmt)
+    assert ROOM_INDEXES[order_by.lstrip("-")] in plan, plan
+    assert "Sort" not in plan, plan
+
+
+def test_room_membership_uses_unique_index(database_url):
+    plan = explain(database_url, room_roles_query(1))
+    assert "uq_room_members_room_user" in plan, plan
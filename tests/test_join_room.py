@@ -0,0 +1,27 @@
+from tests.conftest import run_sql
+
+
+def test_concurrent_rejoin_keeps_invite_use(client, db, make_user):
+    owner, guest, other = (
+        make_user(f"{name}@example.com") for name in ("owner", "guest", "other")
+    )
+    room = client.post("/tasks/rooms", json={"name": "room"}, headers=owner.headers)
+    room_id = room.json()["id"]
+    link = client.post(
+        f"/tasks/rooms/{room_id}/create_invite_link",
+        params={"max_uses": 1},
+        headers=owner.headers,
+    ).json()
+    # Параллельный запрос уже вставил строку, а кэш состава её ещё не видит
+    run_sql(
+        db,
+        "INSERT INTO room_members (room_id, user_id, role) "
+        "VALUES (:room_id, :user_id, 'MEMBER')",
+        room_id=room_id,
+        user_id=guest.id,
+    )
+
+    response = client.post(f"/{link}", headers=guest.headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "User already room member"
+    assert client.post(f"/{link}", headers=other.headers).status_code == 204
@@ -0,0 +1,44 @@
+import fakeredis
+import pytest
+
+CODE = "123456"
+
+
+@pytest.fixture
+def redis(fake_redis):
+    return fakeredis.FakeRedis(server=fake_redis, decode_responses=True)
+
+
+def test_legacy_confirm_code_is_ignored(client, redis, make_user):
+    user = make_user(verified=False)
+    # Код в формате до перехода на хэши: строка под старым ключом
+    redis.set(f"confirm_code:{user.email}", CODE, ex=300)
+
+    response = client.post("/auth/verify", json={"email": user.email, "code": CODE})
+    assert response.status_code == 400
+
+
+def test_legacy_reset_code_is_ignored(client, redis, make_user):
+    user = make_user()
+    redis.set(f"reset_code:{user.email}", CODE, ex=300)
+
+    response = client.post(
+        "/auth/password_reset/confirm",
+        json={"email": user.email, "code": CODE, "password": "new-password"},
+    )
+    assert response.status_code == 401
+
+
+def test_legacy_invite_is_ignored(client, redis, make_user):
+    owner, guest = make_user("owner@example.com"), make_user("guest@example.com")
+    room = client.post("/tasks/rooms", json={"name": "room"}, headers=owner.headers)
+    room_id = room.json()["id"]
+    redis.set(f"invite_code:{room_id}", "invite", ex=60)
+
+    response = client.post(f"/tasks/rooms/{room_id}/invite", headers=guest.headers)
+    assert response.status_code == 403
+
+    link = client.post(
+        f"/tasks/rooms/{room_id}/create_invite_link", headers=owner.headers
+    ).json()
+    assert client.post(f"/{link}", headers=guest.headers).status_code == 204
@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from core.config import setting
+
+
+@pytest.fixture
+def client():
+    from main import app
+
+    # Без lifespan: эндпоинту нужны только пулы и счётчики процесса
+    return TestClient(app)
+
+
+def test_metrics_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(setting, "metrics_token", None)
+    assert client.get("/metrics").status_code == 404
+
+
+@pytest.mark.parametrize("authorization", [None, "Bearer wrong", "secret"])
+def test_metrics_require_token(client, monkeypatch, authorization):
+    monkeypatch.setattr(setting, "metrics_token", "secret")
+    headers = {"Authorization": authorization} if authorization else {}
+    assert client.get("/metrics", headers=headers).status_code == 401
+
+
+def test_metrics_with_token(client, monkeypatch):
+    monkeypatch.setattr(setting, "metrics_token", "secret")
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "db_pool_size" in response.text
+
+
+def test_metrics_not_in_openapi(client):
+    assert "/metrics" not in client.app.openapi()["paths"]
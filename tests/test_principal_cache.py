@@ -0,0 +1,49 @@
+import asyncio
+
+from core.models.redis_helper import PrincipalCache, RedisHelper
+from core.security import create_jwt_token
+
+USER = 1
+PRINCIPAL = {"id": USER, "email": "user@example.com", "is_active": True}
+
+
+def run_workers(scenario):
+    # Два воркера с общим Redis, у каждого свой локальный кэш
+    async def main():
+        helpers = [RedisHelper("redis://localhost") for _ in range(2)]
+        caches = []
+        for helper in helpers:
+            await helper.connect()
+            caches.append(PrincipalCache(helper.conn))
+            await caches[-1].start()
+        try:
+            return await scenario(*caches)
+        finally:
+            for cache in caches:
+                await cache.close()
+            for helper in helpers:
+                await helper.close()
+
+    return asyncio.run(main())
+
+
+def test_invalidate_reaches_other_worker(fake_redis):
+    async def scenario(first, second):
+        await first.set(USER, PRINCIPAL)
+        assert await second.get(USER) == PRINCIPAL
+        await first.invalidate(USER)
+        for _ in range(50):
+            if second._local.get(USER) is None:
+                return True
+            await asyncio.sleep(0.02)
+        return False
+
+    assert run_workers(scenario)
+
+
+def test_expired_token_is_unauthorized(client, make_user):
+    user = make_user()
+    token = create_jwt_token(user.id, token_type="access", time_in_minutes=-1)
+
+    response = client.get("/tasks/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
@@ -0,0 +1,457 @@
+from dataclasses import dataclass
+from typing import Callable
+
+import fakeredis
+import pytest
+from fastapi.routing import APIRoute, APIWebSocketRoute
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import RelationshipProperty
+
+from api.todos.schemas import MAX_BATCH_SIZE, GetRoom, GetTask
+from core.hasher import hashed_content
+from core.models.base import Base
+from core.models.redis_helper import (
+    InvitesCodesCaches,
+    ResetCodesCache,
+    VerificationCodesCache,
+)
+from core.models.rooms import Room
+from tests.conftest import PASSWORD, AuthUser, close_room_socket
+
+CODE = "123456"
+TASK = {"title": "task", "description": "", "due_at": "2030-01-01T00:00:00Z"}
+
+
+@dataclass
+class World:
+    owner: AuthUser
+    member: AuthUser
+    stranger: AuthUser
+    room_id: int
+    task_id: int
+    room_task_id: int
+    redis: fakeredis.FakeRedis
+
+
+@dataclass
+class Case:
+    method: str
+    path: str
+    call: Callable
+    status: int | None = 200
+    # Подготовка вне подсчёта: логин, коды в Redis, принятие задачи
+    prepare: Callable | None = None
+    # Запросы зависимостей, которые не кэшируются (get_task_by_id), и
+    # потоковые ответы: export читает базу уже после обработчика
+    extra: int = 0
+    label: str = ""
+
+    @property
+    def id(self) -> str:
+        return " ".join(filter(None, (self.method, self.path, self.label)))
+
+
+def token(user: AuthUser) -> str:
+    return user.headers["Authorization"].removeprefix("Bearer ")
+
+
+def login(client, user: AuthUser):
+    return client.post(
+        "/auth/login", data={"username": user.email, "password": PASSWORD}
+    )
+
+
+def set_code(cache: type[VerificationCodesCache], name: str, value: str):
+    def prepare(client, w: World):
+        w.redis.hset(f"{cache.KEY_PREFIX}:{name.format(w=w)}", "code", value)
+
+    return prepare
+
+
+def room_path(w: World, suffix: str = "") -> str:
+    return f"/tasks/rooms/{w.room_id}{suffix}"
+
+
+def accept(client, w: World):
+    client.patch(room_path(w, f"/{w.room_task_id}/accept"), headers=w.member.headers)
+
+
+def room_socket(client, w: World):
+    with client.websocket_connect(
+        room_path(w, "/ws"), subprotocols=["bearer", token(w.member)]
+    ) as websocket:
+        close_room_socket(websocket, w.room_id)
+
+
+CASES = [
+    Case(
+        "POST",
+        "/auth/register",
+        lambda c, w: c.post(
+            "/auth/register", json={"email": "new@example.com", "password": "pw"}
+        ),
+    ),
+    Case("POST", "/auth/login", lambda c, w: login(c, w.owner)),
+    Case(
+        "POST",
+        "/auth/refresh",
+        lambda c, w: c.post("/auth/refresh"),
+        prepare=lambda c, w: login(c, w.owner),
+    ),
+    Case(
+        "POST",
+        "/auth/logout",
+        lambda c, w: c.post("/auth/logout"),
+        prepare=lambda c, w: login(c, w.owner),
+    ),
+    Case(
+        "POST",
+        "/auth/verify",
+        lambda c, w: c.post(
+            "/auth/verify", json={"email": w.stranger.email, "code": CODE}
+        ),
+        prepare=set_code(VerificationCodesCache, "{w.stranger.email}", CODE),
+    ),
+    Case(
+        "POST",
+        "/auth/password_reset/request",
+        lambda c, w: c.post(
+            "/auth/password_reset/request", params={"email": w.owner.email}
+        ),
+    ),
+    Case(
+        "POST",
+        "/auth/password_reset/confirm",
+        lambda c, w: c.post(
+            "/auth/password_reset/confirm",
+            json={"email": w.owner.email, "code": CODE, "password": "new-password"},
+        ),
+        prepare=set_code(ResetCodesCache, "{w.owner.email}", hashed_content.hash(CODE)),
+    ),
+    Case("GET", "/tasks/", lambda c, w: c.get("/tasks/", headers=w.owner.headers)),
+    Case(
+        "POST",
+        "/tasks/",
+        lambda c, w: c.post("/tasks/", json=TASK, headers=w.owner.headers),
+        status=201,
+    ),
+    Case(
+        "POST",
+        "/tasks/batch",
+        lambda c, w: c.post(
+            "/tasks/batch", json={"items": [TASK, TASK]}, headers=w.owner.headers
+        ),
+        status=201,
+    ),
+    Case(
+        "POST",
+        "/tasks/batch",
+        lambda c, w: c.post(
+            "/tasks/batch",
+            json={"items": [TASK] * MAX_BATCH_SIZE},
+            headers=w.owner.headers,
+        ),
+        status=201,
+        label="full",
+    ),
+    Case(
+        "PATCH",
+        "/tasks/batch",
+        lambda c, w: c.patch(
+            "/tasks/batch",
+            json={"items": [{"id": w.task_id, "title": "changed"}]},
+            headers=w.owner.headers,
+        ),
+    ),
+    Case(
+        "POST",
+        "/tasks/batch/completed",
+        lambda c, w: c.post(
+            "/tasks/batch/completed",
+            json={"ids": [w.task_id]},
+            headers=w.owner.headers,
+        ),
+    ),
+    Case(
+        "POST",
+        "/tasks/batch/delete",
+        lambda c, w: c.post(
+            "/tasks/batch/delete", json={"ids": [w.task_id]}, headers=w.owner.headers
+        ),
+    ),
+    Case(
+        "GET",
+        "/tasks/export",
+        lambda c, w: c.get("/tasks/export", headers=w.owner.headers),
+        extra=1,
+    ),
+    Case(
+        "GET",
+        "/tasks/search",
+        lambda c, w: c.get(
+            "/tasks/search", params={"q": "task"}, headers=w.owner.headers
+        ),
+    ),
+    Case(
+        "GET",
+        "/tasks/changes",
+        lambda c, w: c.get("/tasks/changes", headers=w.owner.headers),
+    ),
+    Case(
+        "GET",
+        "/tasks/{task_id}",
+        lambda c, w: c.get(f"/tasks/{w.task_id}", headers=w.owner.headers),
+    ),
+    Case(
+        "PATCH",
+        "/tasks/{task_id}",
+        lambda c, w: c.patch(
+            f"/tasks/{w.task_id}", json={"title": "changed"}, headers=w.owner.headers
+        ),
+    ),
+    Case(
+        "POST",
+        "/tasks/{task_id}/completed",
+        lambda c, w: c.post(f"/tasks/{w.task_id}/completed", headers=w.owner.headers),
+        status=204,
+    ),
+    Case(
+        "DELETE",
+        "/tasks/{task_id}",
+        lambda c, w: c.delete(f"/tasks/{w.task_id}", headers=w.owner.headers),
+        extra=1,
+    ),
+    Case(
+        "POST",
+        "/tasks/rooms",
+        lambda c, w: c.post(
+            "/tasks/rooms", json={"name": "r"}, headers=w.owner.headers
+        ),
+    ),
+    Case(
+        "POST",
+        "/tasks/rooms/{room_id}/batch",
+        lambda c, w: c.post(
+            room_path(w, "/batch"), json={"items": [TASK]}, headers=w.owner.headers
+        ),
+        status=201,
+    ),
+    Case(
+        "POST",
+        "/tasks/rooms/{room_id}/batch",
+        lambda c, w: c.post(
+            room_path(w, "/batch"),
+            json={"items": [TASK] * MAX_BATCH_SIZE},
+            headers=w.owner.headers,
+        ),
+        status=201,
+        label="full",
+    ),
+    Case(
+        "PATCH",
+        "/tasks/rooms/{room_id}/batch",
+        lambda c, w: c.patch(
+            room_path(w, "/batch"),
+            json={"items": [{"id": w.room_task_id, "title": "changed"}]},
+            headers=w.owner.headers,
+        ),
+    ),
+    Case(
+        "POST",
+        "/tasks/rooms/{room_id}/batch/completed",
+        lambda c, w: c.post(
+            room_path(w, "/batch/completed"),
+            json={"ids": [w.room_task_id]},
+            headers=w.owner.headers,
+        ),
+    ),
+    Case(
+        "POST",
+        "/tasks/rooms/{room_id}/batch/delete",
+        lambda c, w: c.post(
+            room_path(w, "/batch/delete"),
+            json={"ids": [w.room_task_id]},
+            headers=w.owner.headers,
+        ),
+    ),
+    Case(
+        "GET",
+        "/tasks/rooms/{room_id}/export",
+        lambda c, w: c.get(room_path(w, "/export"), headers=w.member.headers),
+        extra=1,
+    ),
+    Case(
+        "GET",
+        "/tasks/rooms/{room_id}/search",
+        lambda c, w: c.get(
+            room_path(w, "/search"), params={"q": "task"}, headers=w.member.headers
+        ),
+    ),
+    Case(
+        "GET",
+        "/tasks/rooms/{room_id}/changes",
+        lambda c, w: c.get(room_path(w, "/changes"), headers=w.member.headers),
+    ),
+    Case("WS", "/tasks/rooms/{room_id}/ws", room_socket, status=None),
+    Case(
+        "GET",
+        "/tasks/rooms/{room_id}",
+        lambda c, w: c.get(room_path(w), headers=w.member.headers),
+    ),
+    Case(
+        "POST",
+        "/tasks/rooms/{room_id}",
+        lambda c, w: c.post(room_path(w), json=TASK, headers=w.owner.headers),
+    ),
+    Case(
+        "PATCH",
+        "/tasks/rooms/{room_id}/{task_id}",
+        lambda c, w: c.patch(
+            room_path(w, f"/{w.room_task_id}"),
+            json={"title": "changed"},
+            headers=w.owner.headers,
+        ),
+    ),
+    Case(
+        "PATCH",
+        "/tasks/rooms/{room_id}/{task_id}/accept",
+        lambda c, w: c.patch(
+            room_path(w, f"/{w.room_task_id}/accept"), headers=w.member.headers
+        ),
+    ),
+    Case(
+        "PATCH",
+        "/tasks/rooms/{room_id}/{task_id}/completed",
+        lambda c, w: c.patch(
+            room_path(w, f"/{w.room_task_id}/completed"), headers=w.member.headers
+        ),
+        prepare=accept,
+    ),
+    Case(
+        "DELETE",
+        "/tasks/rooms/{room_id}/{task_id:int}",
+        lambda c, w: c.delete(
+            room_path(w, f"/{w.room_task_id}"), headers=w.owner.headers
+        ),
+    ),
+    Case(
+        "POST",
+        "/tasks/rooms/{room_id}/create_invite_link",
+        lambda c, w: c.post(
+            room_path(w, "/create_invite_link"), headers=w.owner.headers
+        ),
+    ),
+    Case(
+        "POST",
+        "/tasks/rooms/{room_id}/{invite_code}",
+        lambda c, w: c.post(room_path(w, "/invite"), headers=w.stranger.headers),
+        status=204,
+        prepare=set_code(InvitesCodesCaches, "{w.room_id}", "invite"),
+    ),
+    Case(
+        "DELETE",
+        "/tasks/rooms/{room_id}/delete_invite_link",
+        lambda c, w: c.delete(
+            room_path(w, "/delete_invite_link"), headers=w.owner.headers
+        ),
+        status=204,
+    ),
+]
+
+
+def budgeted_routes() -> dict[tuple[str, str], int]:
+    from main import app
+
+    budgets = {}
+    for route in app.routes:
+        if isinstance(route, APIWebSocketRoute):
+            methods = ["WS"]
+        elif isinstance(route, APIRoute):
+            methods = route.methods
+        else:
+            continue
+        if not route.path.startswith(("/auth", "/tasks")):
+            continue
+        for method in methods:
+            budgets[method, route.path] = getattr(route.endpoint, "query_budget", None)
+    return budgets
+
+
+def test_every_route_has_budget():
+    assert [key for key, budget in budgeted_routes().items() if budget is None] == []
+
+
+def test_cases_cover_every_route():
+    assert {(case.method, case.path) for case in CASES} == set(budgeted_routes())
+
+
+@pytest.fixture
+def world(client, fake_redis, make_user, make_task):
+    owner = make_user("owner@example.com")
+    member = make_user("member@example.com")
+    stranger = make_user("stranger@example.com", verified=False)
+    room = client.post("/tasks/rooms", json={"name": "room"}, headers=owner.headers)
+    room_id = room.json()["id"]
+    link = client.post(
+        f"/tasks/rooms/{room_id}/create_invite_link", headers=owner.headers
+    ).json()
+    assert client.post(f"/{link}", headers=member.headers).status_code == 204
+    w = World(
+        owner,
+        member,
+        stranger,
+        room_id,
+        make_task(owner),
+        make_task(owner, room_id),
+        fakeredis.FakeRedis(server=fake_redis),
+    )
+    # Прогреваем кэши пользователей и состава комнаты: бюджет - это
+    # стоимость запроса в установившемся режиме
+    for user in (owner, member, stranger):
+        client.get("/tasks/", headers=user.headers)
+        client.get(room_path(w), headers=user.headers)
+    return w
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.id)
+def test_route_within_budget(client, world, query_budget, case):
+    budget = budgeted_routes()[case.method, case.path]
+    if case.prepare is not None:
+        case.prepare(client, world)
+    with query_budget(budget + case.extra):
+        response = case.call(client, world)
+    if case.status is not None:
+        assert response.status_code == case.status, response.text
+
+
+def test_unloaded_relationship_raises(client, world):
+    from core.models import db_helper
+
+    async def touch_members():
+        async with db_helper.session_factory() as session:
+            room = await session.scalar(select(Room).where(Room.id == world.room_id))
+            return room.members
+
+    with pytest.raises(InvalidRequestError, match="lazy='raise_on_sql'"):
+        client.portal.call(touch_members)
+
+
+def test_created_objects_are_serialized_by_schema(client, world):
+    # Ответ собирается по схеме, а не по ORM-объекту: сериализация не
+    # трогает связи и не отдаёт лишние колонки
+    task = client.post("/tasks/", json=TASK, headers=world.owner.headers)
+    assert set(task.json()) == set(GetTask.model_fields)
+    room = client.post("/tasks/rooms", json={"name": "r"}, headers=world.owner.headers)
+    assert set(room.json()) == set(GetRoom.model_fields)
+
+
+def test_relationships_raise_on_sql_in_tests():
+    lazy = {
+        f"{mapper.class_.__name__}.{prop.key}": prop.lazy
+        for mapper in Base.registry.mappers
+        for prop in mapper.relationships
+        if isinstance(prop, RelationshipProperty)
+    }
+    assert lazy
+    assert {name for name, value in lazy.items() if value != "raise_on_sql"} == set()
@@ -0,0 +1,59 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import core.models.redis_helper as redis_module
+from core.config import Settings
+from core.middleware import RateLimitMiddleware
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.hits = []
+
+    async def hit(self, rules) -> float:
+        self.hits.append(rules)
+        return 0
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(redis_module, "rate_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture
+def client():
+    async def endpoint(request):
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/{path:path}", endpoint, methods=["GET", "POST"])])
+    return TestClient(RateLimitMiddleware(app, rate="10/60"))
+
+
+def test_global_limit_is_off_by_default():
+    assert Settings().rate_limit_global is None
+
+
+@pytest.mark.parametrize(
+    "method, path, headers",
+    [
+        ("GET", "/metrics", {}),
+        ("GET", "/tasks/", {"If-None-Match": '"etag"'}),
+    ],
+)
+def test_exempt_requests_skip_limiter(client, limiter, method, path, headers):
+    assert client.request(method, path, headers=headers).status_code == 200
+    assert limiter.hits == []
+
+
+@pytest.mark.parametrize(
+    "method, headers",
+    [("GET", {}), ("POST", {"If-None-Match": '"etag"'})],
+)
+def test_other_requests_are_limited(client, limiter, method, headers):
+    assert client.request(method, "/tasks/", headers=headers).status_code == 200
+    assert len(limiter.hits) == 1
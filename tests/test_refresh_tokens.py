@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from core.models.redis_helper import RedisHelper, RefreshTokenStore
+
+TTL = 3600
+
+
+def make_store(helper: RedisHelper) -> RefreshTokenStore:
+    return RefreshTokenStore(
+        helper.conn,
+        helper.scripts,
+        ttl=TTL,
+        bloom_size=1 << 12,
+        bloom_hashes=3,
+        rebuild_interval=3600,
+        full_rebuild_interval=3600,
+    )
+
+
+def run_workers(scenario):
+    # Два воркера с общим Redis, у каждого свой фильтр
+    async def main():
+        helpers = [RedisHelper("redis://localhost") for _ in range(2)]
+        stores = []
+        for helper in helpers:
+            await helper.connect()
+            stores.append(make_store(helper))
+            await stores[-1].start()
+        try:
+            return await scenario(*stores)
+        finally:
+            for store in stores:
+                await store.close()
+            for helper in helpers:
+                await helper.close()
+
+    return asyncio.run(main())
+
+
+async def wait_revoked(store: RefreshTokenStore, family: str) -> bool:
+    for _ in range(50):
+        if await store.is_revoked(family):
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+
+def test_revoke_reaches_other_worker_without_rebuild(fake_redis):
+    async def scenario(first, second):
+        await first.issue("family", "jti")
+        assert not await second.is_revoked("family")
+        await first.revoke("family")
+        return await wait_revoked(second, "family")
+
+    assert run_workers(scenario)
+
+
+def test_refresh_picks_up_missed_revocations(fake_redis):
+    async def scenario(first, second):
+        # Запись без сообщения в канал: например, потерянного при переподключении
+        await first._redis.zadd(first.REVOKED_KEY, {"missed": time.time() + TTL})
+        assert not await second.is_revoked("missed")
+        await second.refresh()
+        return await second.is_revoked("missed")
+
+    assert run_workers(scenario)
+
+
+def test_rebuild_forgets_expired_families(fake_redis):
+    async def scenario(first, second):
+        await first._redis.zadd(first.REVOKED_KEY, {"expired": time.time() - 1})
+        await second.refresh()
+        assert "expired" in second._revoked
+        await second.rebuild()
+        return "expired" in second._revoked
+
+    assert run_workers(scenario) is False
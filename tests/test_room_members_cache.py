@@ -0,0 +1,52 @@
+import asyncio
+
+from core.models.redis_helper import RedisHelper, RoomMembersCache
+
+ROOM = 1
+OWNER = 10
+
+
+def run(scenario, stale_window: float = 0):
+    async def main():
+        helper = RedisHelper("redis://localhost")
+        await helper.connect()
+        try:
+            cache = RoomMembersCache(
+                helper.conn, helper.scripts, stale_window=stale_window
+            )
+            return await scenario(cache)
+        finally:
+            await helper.close()
+
+    return asyncio.run(main())
+
+
+def test_load_is_cached(fake_redis):
+    async def scenario(cache):
+        version = await cache.version(ROOM)
+        assert await cache.load(ROOM, {OWNER: "creator"}, version)
+        return await cache.get(ROOM, OWNER), await cache.get(ROOM, OWNER + 1)
+
+    assert run(scenario) == ((True, "creator"), (True, None))
+
+
+def test_invalidate_during_load_drops_stale_roles(fake_redis):
+    async def scenario(cache):
+        # Загрузка прочитала базу до смены состава, а пишет уже после
+        version = await cache.version(ROOM)
+        await cache.invalidate(ROOM)
+        assert not await cache.load(ROOM, {OWNER: "creator"}, version)
+        return await cache.get(ROOM, OWNER)
+
+    assert run(scenario) == (False, None)
+
+
+def test_load_after_invalidate_waits_for_replicas(fake_redis):
+    async def scenario(cache):
+        await cache.invalidate(ROOM)
+        # Версия свежая, но реплика могла ещё не догнать primary
+        version = await cache.version(ROOM)
+        return await cache.load(ROOM, {OWNER: "creator"}, version)
+
+    assert run(scenario, stale_window=0) is True
+    assert run(scenario, stale_window=60) is False
@@ -0,0 +1,79 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from core.models.redis_helper import get_room_members_cache
+from core.security import create_jwt_token
+from tests.conftest import PASSWORD, close_room_socket, run_sql
+
+
+@pytest.fixture
+def room(client, make_user):
+    owner, member = make_user("owner@example.com"), make_user("member@example.com")
+    room_id = client.post(
+        "/tasks/rooms", json={"name": "room"}, headers=owner.headers
+    ).json()["id"]
+    link = client.post(
+        f"/tasks/rooms/{room_id}/create_invite_link", headers=owner.headers
+    ).json()
+    assert client.post(f"/{link}", headers=member.headers).status_code == 204
+    return room_id, member
+
+
+def connect(client, room_id: int, token: str):
+    return client.websocket_connect(
+        f"/tasks/rooms/{room_id}/ws", subprotocols=["bearer", token]
+    )
+
+
+def bearer(user) -> str:
+    return user.headers["Authorization"].removeprefix("Bearer ")
+
+
+def test_token_in_query_string_is_rejected(client, room):
+    room_id, member = room
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect(
+            f"/tasks/rooms/{room_id}/ws?token={bearer(member)}"
+        ):
+            pass
+    assert error.value.code == 1008
+
+
+def test_socket_accepts_bearer_subprotocol(client, room):
+    room_id, member = room
+    with connect(client, room_id, bearer(member)) as websocket:
+        assert websocket.accepted_subprotocol == "bearer"
+        client.portal.call(get_room_members_cache().invalidate, room_id)
+        assert websocket.receive_json()["type"] == "members_changed"
+        close_room_socket(websocket, room_id)
+
+
+def test_socket_closes_when_token_expires(client, room):
+    room_id, member = room
+    # exp в JWT - целые секунды: токен живёт от одной до двух секунд
+    token = create_jwt_token(member.id, token_type="access", time_in_minutes=2 / 60)
+    with connect(client, room_id, token) as websocket:
+        assert websocket.receive()["code"] == 1008
+
+
+def test_socket_closes_when_family_is_revoked(client, room):
+    room_id, member = room
+    login = client.post(
+        "/auth/login", data={"username": member.email, "password": PASSWORD}
+    )
+    with connect(client, room_id, login.json()["access_token"]) as websocket:
+        client.post("/auth/logout")
+        assert websocket.receive()["code"] == 1008
+
+
+def test_socket_closes_when_member_is_removed(client, db, room):
+    room_id, member = room
+    with connect(client, room_id, bearer(member)) as websocket:
+        run_sql(
+            db,
+            "DELETE FROM room_members WHERE room_id = :room_id AND user_id = :user_id",
+            room_id=room_id,
+            user_id=member.id,
+        )
+        client.portal.call(get_room_members_cache().invalidate, room_id, member.id)
+        assert websocket.receive()["code"] == 1008